@@ -5,13 +5,137 @@ Created on Sun Jan 18 10:02:57 2026
 @author: DOM1804
 """
 import os
+import sys
+import json
+import glob
+import shutil
+import hashlib
+import tempfile
+import argparse
+import mmap
+import cProfile
+import pstats
+import contextlib
+import collections
+import functools
+import tracemalloc
+import time
+import zlib
+import struct
+import queue
+import threading
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
 from PIL import Image, ImageDraw
+try:
+    import numpy as np
+except ImportError: #numpy is optional, only the vectorized engine needs it
+    np = None
 
 GENERATIONS = 10
+RULE = 'B3/S23' #birth/survival rulestring, B3/S23 is Conway's Game of Life
+ENGINE = 'python' #step engine used by run_application, see ENGINES
+HASHLIFE_MAX_NODES = 1000000 #size limit of the HashLife node and result caches
+WORKERS = os.cpu_count() or 1 #number of processes used by the parallel engine
+WRITER_THREADS = 2 #threads encoding and writing output files in the background
+WRITER_QUEUE_SIZE = 8 #max number of pending write jobs (backpressure for the simulation)
 
 CELL_SIZE = 20 #pixels
 BORDER_WIDTH = 2 #pixels
 BASE_COLOR = (0, 255, 0)  #bright green in RGB
+OUTPUT_FORMAT = 'png' #'png' - one PNG per generation, 'apng' - all generations in ANIMATION_FILE,
+                      #'tiles' - a zoomable tile pyramid per generation in TILES_DIR (for very large boards)
+ANIMATION_FILE = 'generations.png' #animated PNG, written to the output folder
+FRAME_DELAY_MS = 200 #display time of one generation in the animation
+TILES_DIR = 'tiles' #tile pyramids, written to the output folder
+TILE_SIZE = 256 #pixels, side of a tile
+DATA_FORMAT = 'csv' #'csv' - one CSV per generation, 'snapshot' - all generations in SNAPSHOT_FILE
+SNAPSHOT_FILE = 'generations.gol' #binary snapshot file, written to the output folder
+SNAPSHOT_RLE = False #run-length encode the snapshot records (smaller for sparse boards, but slow on large ones)
+CYCLE_MAX_PERIOD = 0 #detect still lifes and cycles up to this period (0 - off)
+ON_CYCLE = 'fast-forward' #'stop' - end the run, 'fast-forward' - replay the cycle without stepping the engine
+CYCLE_SUMMARY_FILE = 'cycle_summary.txt' #written to the output folder when a cycle is found
+METRICS_FILE = None #JSONL file (in the output folder) for per-stage timings, e.g. 'metrics.jsonl'; None - off
+PROFILE_GENERATIONS = None #(first, last) generations run under cProfile and tracemalloc; None - off
+PROFILE_FILE = 'profile.prof' #cProfile statistics (pstats format), written to the output folder
+CHECKPOINT_EVERY = None #generations between checkpoints in the output folder; None - off
+CHECKPOINT_SECONDS = None #seconds between checkpoints; None - off
+CHECKPOINT_KEEP = 2 #number of the latest checkpoints kept
+RESUME = False #True - run_application continues from the latest valid checkpoint in the output folder
+CACHE_DIR = None #folder of the cross-run result cache (e.g. os.path.expanduser('~/.gol_cache')); None - off
+CACHE_MAX_BYTES = 2 * 1024 ** 3 #size limit of the cache, the least recently used entries are removed
+CACHE_VERIFY = False #True - a cache hit reads the files to check their CRC32, False - only sizes and mtimes
+SOUP_DENSITY = 0.35 #probability of a live cell in a random soup
+ENSEMBLE_MAX_PERIOD = 2 #ensemble boards that repeat one of their last states up to this period are dropped
+ENSEMBLE_BATCH = 1024 #max number of boards advanced together by run_ensemble (bounds the memory)
+ENSEMBLE_FILE = 'ensemble.csv' #per-board results of the ensemble mode, written to the output folder
+
+def parse_rule(rulestring):
+    '''
+    @requires: rulestring of a Life-like rule: 'B<digits>/S<digits>' (in any order, any case),
+      or the legacy '<survival digits>/<birth digits>' notation, digits are 0..8
+      E.g. 'B3/S23' (Conway), 'B36/S23' (HighLife), 'B2/S' (Seeds)
+    @modifies: None
+    @effects: None
+    @raises: ValueError if the rulestring is invalid
+    @returns: a tuple (birth counts, survival counts) of sorted tuples of ints
+
+    TESTS
+    >>> parse_rule('B36/S23')
+    ((3, 6), (2, 3))
+    >>> parse_rule('23/3'), parse_rule('s/b2')
+    (((3,), (2, 3)), ((2,), ()))
+    >>> parse_rule('B9/S23')
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid rulestring 'B9/S23', expected e.g. 'B3/S23'
+    '''
+    parts = rulestring.strip().upper().split('/')
+    error = ValueError(f"Invalid rulestring '{rulestring}', expected e.g. 'B3/S23'")
+    if len(parts) != 2:
+        raise error
+    if parts[0][:1] in ('B', 'S') and parts[1][:1] in ('B', 'S') and parts[0][0] != parts[1][0]:
+        counts = {part[0]: part[1:] for part in parts}
+        birth, survival = counts['B'], counts['S']
+    else:
+        survival, birth = parts #legacy S/B notation
+    digits = birth + survival
+    if any(char not in '012345678' for char in digits):
+        raise error
+    return tuple(sorted(set(map(int, birth)))), tuple(sorted(set(map(int, survival))))
+
+
+def rule_table(rulestring=None):
+    '''
+    @requires: rulestring accepted by parse_rule or None (then RULE is used)
+    @modifies: None
+    @effects: None
+    @raises: ValueError if the rulestring is invalid
+    @returns: the rule compiled into a lookup table: table[state][live neighbours]
+      is the next state (0/1) of a cell, state is 0/1 and the count is 0..8.
+      The table is compiled once per rulestring and shared by all step engines.
+
+    TESTS
+    >>> rule_table('B3/S23')
+    ((0, 0, 0, 1, 0, 0, 0, 0, 0), (0, 0, 1, 1, 0, 0, 0, 0, 0))
+    '''
+    #None is resolved here, outside the cache, so a later change of RULE is not hidden by it
+    return _compile_rule(RULE if rulestring is None else rulestring)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_rule(rulestring):
+    birth, survival = parse_rule(rulestring)
+    return (tuple(1 if count in birth else 0 for count in range(9)),
+            tuple(1 if count in survival else 0 for count in range(9)))
+
+
+def _check_no_b0(rulestring, engine):
+    #engines that skip empty regions cannot run rules where empty cells come alive
+    if rule_table(rulestring)[0][0]:
+        raise ValueError(f'The {engine} engine does not support rules with B0')
+
 
 def live_neighbors(grid, row, col):
     '''
@@ -53,7 +177,7 @@ def live_neighbors(grid, row, col):
 
 #Moves the simulation 1 step forward
 #Based on the current state returns the next state generation as output
-def model(grid):
+def model(grid, rule=None):
     '''
     @requires: grid which is a list of lists where
       each list contains either 0 or 1
@@ -64,12 +188,14 @@ def model(grid):
        [0,0,0],
        [1,1,0]
        ]
+      rule is a rulestring (see parse_rule) or None (then RULE is used)
     @modifies: None
     @effects: None
     @raises: None
     @returns: a new grid which follows the format of the input grid
       but with the cell values corresponding to the new generation.
-      The generation is determined by the following rules:
+      The generation is determined by the rule table (rule_table), for the default
+      Conway rule B3/S23 these are the following rules:
           1. Any live cell with fewer than two live neighbours dies, as if by underpopulation.
           2. Any live cell with two or three live neighbours lives on to the next generation.
           3. Any live cell with more than three live neighbours dies, as if by overpopulation.
@@ -79,267 +205,3222 @@ def model(grid):
     >>> grid = [[0,1,0],[0,0,0],[1,1,0]]
     >>> model(grid)
     [[0, 0, 0], [1, 1, 0], [0, 0, 0]]
+    >>> model([[1,0,0],[0,0,0],[0,0,1]], 'B2/S') #Seeds
+    [[0, 0, 0], [0, 1, 0], [0, 0, 0]]
     '''
+    table = rule_table(rule)
     rows, cols = len(grid), len(grid[0])
     new_grid = [[0 for _ in range(cols)] for _ in range(rows)]
     for row in range(rows):
         for col in range(cols):
             live_nb = live_neighbors(grid, row, col)
-            if grid[row][col] == 1 and (live_nb < 2 or live_nb > 3):
-                new_grid[row][col] = 0
-            elif grid[row][col] == 1 and live_nb in (2,3):
-                new_grid[row][col] = 1
-            elif grid[row][col] == 0 and live_nb == 3:
-                new_grid[row][col] = 1
-            else:
-                new_grid[row][col] = 0
+            new_grid[row][col] = table[grid[row][col]][live_nb]
     return new_grid
 
 
-def read_input(filename):
+def neighbor_counts_numpy(board):
     '''
-    @requires: a filename of the valid CSV-file with rows of 0/1 separated by semicolon.
-      Each line must have the same number of elements.
-      File must exist and be readable from the same directory as the executed .py file
+    @requires: board which is a 2-D numpy array of 0/1 (any integer dtype),
+      or a stack of boards (..., rows, cols)
     @modifies: None
     @effects: None
-    @raises: FileNotFoundError if the file not found.
-      ValueError if the format invalid:
-          - the file is empty (contains no valid rows)
-          - any line contains non-integer values,
-          - any value is not 0 or 1,
-          - lines have inconsistent lengths.
-    @returns: a grid which is a list of lists of integers (0/1)
-    
+    @raises: None
+    @returns: a uint8 array of the same shape with the number of live neighbours of every cell.
+      Cells outside the board are treated as dead (same boundary as live_neighbors).
+
+    TESTS
+    >>> board = np.array([[0, 1, 0], [0, 0, 0], [1, 1, 0]])
+    >>> neighbor_counts_numpy(board).tolist()
+    [[1, 0, 1], [3, 3, 2], [1, 1, 1]]
+    >>> neighbor_counts_numpy(np.stack([board, 1 - board]))[1].tolist()
+    [[2, 5, 2], [2, 5, 3], [2, 4, 2]]
     '''
-    grid = []
-    try:
-        with open(filename, 'r') as input_file:
-            lines = input_file.readlines()
-    except FileNotFoundError:
-        raise FileNotFoundError(f'File {filename} not found in the current directory.')
-        
-    for line_num, line in enumerate(lines):        
-        stripped = line.strip() #by default strip removes string.whitespace characters 
-        if not stripped:
-            continue #skip empty lines
-        try:
-            data_row = [int(elem) for elem in stripped.split(';')]
-        except ValueError:
-            raise ValueError(f'Line_num {line_num}:non-integer value in {stripped}')
-        
-        for val in data_row:
-            if val not in (0,1):
-                raise ValueError(f'Line_num {line_num}: invalid value {val}, expected 0 or 1')
-        
-        if grid and len(data_row) != len(grid[0]): #length of the current list is not equal to the previously appended one
-            raise ValueError(f'Line_num {line_num}: inconsistent number of columns (expected {len(grid[0])}, got {len(data_row)})')            
-                    
-        grid.append(data_row)
-    #Empty/whitespace-only file check
-    if not grid:
-        raise ValueError(f'The file {filename} is empty or contains no valid data rows')
-    
-    return grid
+    #pad every board with one ring of dead cells, then sum the 8 shifted views of the padded boards
+    padded = np.pad(board.astype(np.uint8, copy=False), [(0, 0)] * (board.ndim - 2) + [(1, 1), (1, 1)])
+    rows, cols = board.shape[-2:]
+    counts = np.zeros(board.shape, dtype=np.uint8)
+    for d_row in range(3):
+        for d_col in range(3):
+            if d_row == 1 and d_col == 1: #the cell itself is not a neighbour
+                continue
+            counts += padded[..., d_row:d_row + rows, d_col:d_col + cols]
+    return counts
 
 
-def write_output(grid, filename):
+def _numpy_rule_table(rulestring=None):
+    return _compile_numpy_rule(RULE if rulestring is None else rulestring)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_numpy_rule(rulestring):
+    #flat table: index = 9 * state + live neighbours
+    return np.array(rule_table(rulestring), dtype=np.uint8).ravel()
+
+
+def step_numpy(board, rule=None):
     '''
-    @requires: grid which is a list of lists of integers (0/1),
-               filename to use for naming of the output file
-    @modifies: writes CSV-file to file system (the current directory)
-    @effects: creates or overwrites filename with grid in CSV format (semicolon-separated)
-    @raises: IOError if cannot write the file
-    @returns: None
-    
+    @requires: board which is a 2-D numpy array of 0/1 (or a stack of boards, see neighbor_counts_numpy),
+      rule is a rulestring or None (then RULE is used)
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: a new uint8 array with the next generation (same rules as model),
+      every cell is looked up in the rule table by (state, live neighbours)
+
     TESTS
-    >>> grid = [[1,0],[0,1]]
-    >>> import os
-    >>> test_file = 'test_write.csv'
-    >>> try:
-    ...     write_output(grid, test_file)
-    ...     with open(test_file, 'r') as f: content = f.read()
-    ...     content
-    ... finally:
-    ...     if os.path.exists(test_file):
-    ...         os.remove(test_file)
-    '1;0\\n0;1\\n'
+    >>> step_numpy(np.array([[0, 1, 0], [0, 0, 0], [1, 1, 0]])).tolist()
+    [[0, 0, 0], [1, 1, 0], [0, 0, 0]]
     '''
-    with open(filename, 'w') as f:
-        for row in grid:
-            f.write(';'.join([str(elem) for elem in row]) + '\n')
-        
-def init_age_grid(grid):
+    index = neighbor_counts_numpy(board)
+    index += board.astype(np.uint8, copy=False) * np.uint8(9)
+    return _numpy_rule_table(rule)[index]
+
+
+def model_numpy(grid, rule=None):
     '''
-    @requires: grid is a list of lists of 0/1
+    @requires: grid and rule in the same format as for model,
+      numpy must be installed
     @modifies: None
     @effects: None
-    @raises: None
-    @returns: age_grid with same dimensions as grid
+    @raises: ImportError if numpy is not installed
+    @returns: a new grid (list of lists of int) with the next generation.
+      Vectorized drop-in replacement for model: the neighbour counts of the whole board
+      are computed at once with shifted-array sums instead of calling live_neighbors per cell.
 
-    TESTS:
-    >>> grid = [[1,0],[0,1]]
-    >>> init_age_grid(grid)
-    [[1, 0], [0, 1]]
+    TESTS
+    >>> grid = [[0,1,0],[0,0,0],[1,1,0]]
+    >>> model_numpy(grid)
+    [[0, 0, 0], [1, 1, 0], [0, 0, 0]]
+    >>> model_numpy([[1,1],[1,1]]) == model([[1,1],[1,1]])
+    True
     '''
-    #created from scratch because age grid defines life expectancy, while grid - only current cell state
-    return [[1 if cell == 1 else 0 for cell in row] for row in grid]
+    if np is None:
+        raise ImportError('numpy is required for the numpy engine')
+    return step_numpy(np.array(grid, dtype=np.uint8), rule).tolist()
 
 
-def update_age_grid(grid, prev_age_grid):
+class PythonEngine:
     '''
-    @requires: grid and prev_age_grid have same dimensions;
-               grid contains only 0/1;
-               prev_age_grid contains non-negative integers
+    Step engine based on the reference model function.
+    Every engine keeps the board in its own representation and exposes:
+      step() - moves the simulation 1 generation forward,
+      to_grid() - returns the current board as a list of lists of 0/1.
+    Engines are created with the grid and an optional rulestring (RULE by default).
+
+    TESTS
+    >>> engine = PythonEngine([[0,1,0],[0,0,0],[1,1,0]])
+    >>> engine.step()
+    >>> engine.to_grid()
+    [[0, 0, 0], [1, 1, 0], [0, 0, 0]]
+    '''
+    def __init__(self, grid, rule=None):
+        self.grid = grid
+        self.rule = rule
+
+    def step(self):
+        self.grid = model(self.grid, self.rule)
+
+    def to_grid(self):
+        return self.grid
+
+
+class NumpyEngine:
+    '''
+    Step engine that keeps the board as a numpy array between generations,
+    so the list <-> array conversion is only paid when to_grid() is called.
+
+    TESTS
+    >>> engine = NumpyEngine([[0,1,0],[0,0,0],[1,1,0]])
+    >>> engine.step()
+    >>> engine.to_grid()
+    [[0, 0, 0], [1, 1, 0], [0, 0, 0]]
+    '''
+    def __init__(self, grid, rule=None):
+        if np is None:
+            raise ImportError('numpy is required for the numpy engine')
+        self.board = np.array(grid, dtype=np.uint8)
+        self.rule = rule
+
+    def step(self):
+        self.board = step_numpy(self.board, self.rule)
+
+    def to_grid(self):
+        return self.board.tolist()
+
+
+def _add3(bits_a, bits_b, bits_c):
+    '''
+    Full adder applied to every bit position of 3 packed rows at once.
+    Returns (sum, carry) bit rows.
+    '''
+    partial = bits_a ^ bits_b
+    return partial ^ bits_c, (bits_a & bits_b) | (partial & bits_c)
+
+
+def bitrow_next(above, row, below, mask, birth=(3,), survival=(2, 3)):
+    '''
+    @requires: above, row, below are non-negative ints where bit c is the state of column c
+      of 3 consecutive rows (0 for a row outside the board),
+      mask = 2**cols - 1,
+      birth and survival are the neighbour counts of the rule (parse_rule), Conway by default
     @modifies: None
     @effects: None
-    @raises: IndexError if dimensions mismatch
-    @returns: new age_grid where alive cells increment age, dead cells reset to 0.
+    @raises: None
+    @returns: the packed next generation of the middle row.
+      The 8 neighbour rows (shifted copies of above/row/below) are summed with bit-parallel
+      full adders into 4 count planes (ones, twos, fours, eights), so all columns are processed
+      by a handful of int operations instead of a loop over cells. The cells with a count
+      from birth (dead) or survival (alive) are selected by matching the planes.
 
-    TESTS:
-    >>> grid = [[1,0],[1,1]]
-    >>> prev = [[2,0],[3,1]]
-    >>> update_age_grid(grid, prev)
-    [[3, 0], [4, 2]]
+    TESTS
+    >>> bin(bitrow_next(0b000, 0b111, 0b000, 0b111))
+    '0b10'
+    >>> bin(bitrow_next(0b010, 0b010, 0b010, 0b111))
+    '0b111'
+    >>> bin(bitrow_next(0b000, 0b101, 0b000, 0b111, birth=(2,), survival=()))
+    '0b10'
     '''
-    rows = len(grid)
-    cols = len(grid[0])
-    new_age = [[0 for _ in range(cols)] for _ in range(rows)]
-    for r in range(rows):
-        for c in range(cols):
-            if grid[r][c] == 1:
-                new_age[r][c] = prev_age_grid[r][c] + 1
-    return new_age
+    #neighbours to the left/right are the rows shifted by one column, bits leaving the board are dropped
+    ones_1, twos_1 = _add3((above << 1) & mask, above, above >> 1)
+    ones_2, twos_2 = _add3((below << 1) & mask, below, below >> 1)
+    west, east = (row << 1) & mask, row >> 1
+    ones_3, twos_3 = west ^ east, west & east
+    ones, twos_4 = _add3(ones_1, ones_2, ones_3)
+    #four carries of weight 2: their sum gives the twos, fours and eights planes
+    twos_partial, fours_1 = _add3(twos_1, twos_2, twos_3)
+    twos = twos_partial ^ twos_4
+    fours_2 = twos_partial & twos_4
+    fours, eights = fours_1 ^ fours_2, fours_1 & fours_2
+    planes = (ones, twos, fours, eights)
 
-def write_png(grid, age_grid, filename):
+    def count_is(count):
+        #bit set where the neighbour count equals count
+        bits = mask
+        for weight, plane in enumerate(planes):
+            bits &= plane if count >> weight & 1 else ~plane
+        return bits
+
+    born = survived = 0
+    for count in birth:
+        born |= count_is(count)
+    for count in survival:
+        survived |= count_is(count)
+    return ((born & ~row) | (survived & row)) & mask
+
+
+class BitGrid:
     '''
-    @requires: grid and age_grid are same-sized lists of lists,
-               grid contains 0/1,
-               age_grid contains non-negative integers,
-               filename to use for naming of the output file.
-    @modifies: writes PNG file to file system (the current directory)
-    @effects: saves image as PNG with age-based shading. Alive cells are shaded versions of BASE_COLOR (RGB).
-              Darkest shade is 10% brightness. Dead cells are white.
-    @raises: IOError if cannot save
-    @returns: None
+    Compact grid where every row is packed into one Python int (bit c = column c).
+    A 1000-column row takes ~160 bytes instead of ~8 KB for a list of ints.
+    Works as a step engine (step/to_grid), the step kernel is bitrow_next.
 
-    TESTS:
-    >>> grid = [[1,0],[1,1]]
-    >>> age = [[1,0],[5,10]]
-    >>> import os
-    >>> test_file = 'test_shade.png'
-    >>> try:
-    ...     write_png(grid, age, test_file)
-    ...     assert os.path.exists(test_file)
-    ... finally:
-    ...     if os.path.exists(test_file):
-    ...         os.remove(test_file)
-    '''    
-    rows, cols = len(grid), len(grid[0])
-    
-    max_age = GENERATIONS
-    
-    cell_size = CELL_SIZE
-    line_width = BORDER_WIDTH
-    total_width = cols * (cell_size + line_width) + line_width
-    total_height = rows *(cell_size + line_width) + line_width
-    
-    im = Image.new(mode='RGB', size=(total_width, total_height), color=(255, 255, 255)) #white background
-    #im.show()
-    #use ImageDraw-object to enable drawing
-    draw = ImageDraw.Draw(im)
+    TESTS
+    >>> bit_grid = BitGrid.from_grid([[0,1,0],[0,0,0],[1,1,0]])
+    >>> bit_grid.rows
+    [2, 0, 3]
+    >>> bit_grid.step()
+    >>> bit_grid.to_grid()
+    [[0, 0, 0], [1, 1, 0], [0, 0, 0]]
+    >>> BitGrid([[1,0,1,1]]).to_grid()
+    [[1, 0, 1, 1]]
+    '''
+    __slots__ = ('rows', 'width', 'birth', 'survival')
 
-    #draw grid lines in light-gray
-    #vertical
-    for col in range(cols + 1):
-        x = col * cell_size + col * line_width
-        draw.line([(x, 0), (x, total_height)], fill=(200, 200, 200), width=line_width)
+    def __init__(self, grid, rule=None):
+        self.width = len(grid[0])
+        self.rows = [pack_row(row) for row in grid]
+        table = rule_table(rule)
+        self.birth = tuple(count for count in range(9) if table[0][count])
+        self.survival = tuple(count for count in range(9) if table[1][count])
 
-    #horizontal
-    for row in range(rows + 1):
-        y = row * cell_size + row * line_width
-        draw.line([(0, y), (total_width, y)], fill=(200, 200, 200), width=line_width)
+    @classmethod
+    def from_grid(cls, grid, rule=None):
+        return cls(grid, rule)
 
-    #color live cells
-    r_base, g_base, b_base = BASE_COLOR
-    for row in range(rows):
-        for col in range(cols):
-            if grid[row][col] == 1:
-                age = age_grid[row][col]
-                factor = max(0.1, 1.0 - min(age / max_age, 0.9))
-                shaded_color = (
-                    int(r_base * factor),
-                    int(g_base * factor),
-                    int(b_base * factor)
-                )
+    def step(self):
+        rows = self.rows
+        mask = (1 << self.width) - 1
+        last = len(rows) - 1
+        above = 0
+        new_rows = []
+        for idx, row in enumerate(rows):
+            below = rows[idx + 1] if idx < last else 0
+            new_rows.append(bitrow_next(above, row, below, mask, self.birth, self.survival))
+            above = row
+        self.rows = new_rows
 
-                x0 = col * cell_size + col * line_width + line_width
-                y0 = row * cell_size + row * line_width + line_width
-                x1 = x0 + cell_size - 1
-                y1 = y0 + cell_size - 1
-                draw.rectangle([x0, y0, x1, y1], fill=shaded_color)
+    def to_grid(self):
+        return [unpack_row(row, self.width) for row in self.rows]
 
-    # draw.rectangle([(BORDER_WIDTH, BORDER_WIDTH), 
-    #                 (BORDER_WIDTH + CELL_SIZE, BORDER_WIDTH + CELL_SIZE)],
-    #                fill='#00FF00', outline='#00FF00')
-    
-    im.save(filename)
 
-def run_application():
+def pack_row(row):
     '''
-    @requires: a valid CSV-file placed in the same directory as the executable file (working directory)
-    @modifies: 
-        - creates or uses the existing folder 'output_files' in the working directory,
-        - creates output files (csv and png) for all generations and saves the result in the 'output_files' folder
-    @effects:
-        - asks user to enter the filename
-        - validates the file format and content
-        - simulates cell evolution
-        - saves each generation in csv (grid) and png (visualization includes ageing) files.
-    @raises:
-        - FileNotFoundError — when file is not found by name;
-        - ValueError — when the file format is not valid.
-    @returns: None
+    @requires: row which is a list of 0/1
+    @modifies: None
+    @effects: None
+    @raises: ValueError if the row contains values other than 0/1
+    @returns: an int where bit c is equal to row[c]
+
+    TESTS
+    >>> pack_row([1, 1, 0, 0])
+    3
     '''
-    output_dir = 'output_files'
-    os.makedirs(output_dir, exist_ok=True)
-    while True:
-        upload_file = input('Enter filename for upload, e.g. \'myfile.csv \' (without quotes):').strip()
-        if not upload_file:
-            print('The filename cannot be empty. Please, try again')
-            continue
-        if not upload_file.lower().endswith('.csv'):
-            print('Accepted only csv format. Please, try again')
-        try:
-            grid = read_input(upload_file)
-            break
-        
-        except FileNotFoundError as e:
-            print(f'{e}')
-        
-        except ValueError as e:
-            print(f'Error in the file: {e}')
+    return int(''.join(map(str, reversed(row))) or '0', 2)
 
-    age_grid = init_age_grid(grid)
 
-    #Save initial state in PNG-file
-    write_png(grid, age_grid, os.path.join(output_dir, f"generation_{0:02d}.png"))
+def unpack_row(bits, width):
+    '''
+    @requires: bits is a non-negative int, width is the number of columns
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: a list of width values 0/1 (inverse of pack_row)
+
+    TESTS
+    >>> unpack_row(3, 4)
+    [1, 1, 0, 0]
+    '''
+    return [1 if char == '1' else 0 for char in reversed(format(bits, f'0{width}b'))]
+
+
+NEIGHBOR_OFFSETS = tuple((d_row, d_col) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)
+                         if (d_row, d_col) != (0, 0))
+
+class SparseEngine:
+    '''
+    Active-set step engine: keeps the set of live cells and the set of cells that changed
+    in the previous step. A cell whose 3x3 neighbourhood did not change keeps its state,
+    so only the cells around the last changes are evaluated and a generation costs
+    O(activity) instead of O(rows*cols). Rules with B0 are not supported.
+
+    TESTS
+    >>> engine = SparseEngine([[0,1,0],[0,0,0],[1,1,0]])
+    >>> sorted(engine.live)
+    [(0, 1), (2, 0), (2, 1)]
+    >>> engine.step()
+    >>> engine.to_grid()
+    [[0, 0, 0], [1, 1, 0], [0, 0, 0]]
+    >>> engine.step()
+    >>> engine.to_grid(), len(engine.changed)
+    ([[0, 0, 0], [0, 0, 0], [0, 0, 0]], 2)
+    >>> engine.step()
+    >>> len(engine.changed)
+    0
+    '''
+    def __init__(self, grid, rule=None):
+        _check_no_b0(rule, 'sparse')
+        self.table = rule_table(rule)
+        self.height, self.width = len(grid), len(grid[0])
+        self.live = {(row, col) for row, cells in enumerate(grid)
+                     for col, cell in enumerate(cells) if cell == 1}
+        #initially every live cell counts as changed (dead cells far from them stay dead)
+        self.changed = set(self.live)
+
+    def step(self):
+        live = self.live
+        height, width = self.height, self.width
+        #cells to evaluate: the changed cells and their neighbours inside the board
+        candidates = set()
+        for row, col in self.changed:
+            candidates.add((row, col))
+            for d_row, d_col in NEIGHBOR_OFFSETS:
+                n_row, n_col = row + d_row, col + d_col
+                if 0 <= n_row < height and 0 <= n_col < width:
+                    candidates.add((n_row, n_col))
+
+        table = self.table
+        born, died = [], []
+        for row, col in candidates:
+            live_nb = 0
+            for d_row, d_col in NEIGHBOR_OFFSETS:
+                if (row + d_row, col + d_col) in live:
+                    live_nb += 1
+            if (row, col) in live:
+                if not table[1][live_nb]:
+                    died.append((row, col))
+            elif table[0][live_nb]:
+                born.append((row, col))
+
+        live.difference_update(died)
+        live.update(born)
+        self.changed = set(born)
+        self.changed.update(died)
+
+    def to_grid(self):
+        grid = [[0] * self.width for _ in range(self.height)]
+        for row, col in self.live:
+            grid[row][col] = 1
+        return grid
+
+
+class QuadNode:
+    '''
+    Node of the HashLife quadtree. A node of level k is a 2**k x 2**k square made of
+    4 children of level k-1 (nw, ne, sw, se); level 0 nodes are single cells.
+    Nodes are immutable and hash-consed by HashLife.join, so identical squares share one node.
+    '''
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population')
+
+    def __init__(self, level, nw, ne, sw, se, population):
+        self.level = level
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.population = population
+
+
+class HashLife:
+    '''
+    HashLife engine: the board is a hash-consed quadtree, and the result of advancing
+    every node is memoized, so repeated patterns (in space and in time) are computed once
+    and the simulation can jump 2**k generations with a single call.
+
+    Unlike the other engines the plane is unbounded: cells beyond the board edge can be born,
+    and to_grid() returns the window of the original board. The result is the same as model()
+    while the pattern does not reach the board edge.
+
+    Memory is bounded by max_nodes: when the node table or the result cache grows beyond it,
+    the oldest half of its entries is evicted (evicted results are recomputed on demand).
+    Rules with B0 are not supported.
+
+    TESTS
+    >>> blinker = [[0,0,0,0,0],[0,0,1,0,0],[0,0,1,0,0],[0,0,1,0,0],[0,0,0,0,0]]
+    >>> life = HashLife(blinker)
+    >>> life.step()
+    >>> life.to_grid() == model(blinker)
+    True
+    >>> life.advance(999999)
+    >>> life.generation, life.to_grid() == blinker
+    (1000000, True)
+    >>> glider = [[0,1,0,0],[0,0,1,0],[1,1,1,0],[0,0,0,0]]
+    >>> life = HashLife(glider, max_nodes=64)
+    >>> life.jump(2) #4 generations: the glider moves one cell down-right
+    >>> life.to_grid()
+    [[0, 0, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1], [0, 1, 1, 1]]
+    >>> life.population()
+    5
+    '''
+    def __init__(self, grid, max_nodes=HASHLIFE_MAX_NODES, rule=None):
+        _check_no_b0(rule, 'hashlife')
+        self.table_rule = rule_table(rule)
+        self.max_nodes = max_nodes
+        self.table = {}  #(nw, ne, sw, se) -> canonical node
+        self.results = {}  #(node, j) -> centre of node advanced by 2**j generations
+        self.empties = []  #empty node of every level, index = level
+        self.off = QuadNode(0, None, None, None, None, 0)
+        self.on = QuadNode(0, None, None, None, None, 1)
+        self.height, self.width = len(grid), len(grid[0])
+        self.generation = 0
+
+        level = 2
+        while (1 << level) < max(self.height, self.width):
+            level += 1
+        cells = [(row, col) for row, cells in enumerate(grid)
+                 for col, cell in enumerate(cells) if cell == 1]
+        self.root = self._build(level, 0, 0, cells)
+        self.top, self.left = 0, 0  #absolute position of the root's top-left cell
+
+    def _evict(self, cache):
+        #drop the oldest half of the entries (dicts keep insertion order)
+        for key in list(cache)[:len(cache) // 2]:
+            del cache[key]
+
+    def join(self, nw, ne, sw, se):
+        key = (nw, ne, sw, se)
+        node = self.table.get(key)
+        if node is None:
+            if len(self.table) >= self.max_nodes:
+                self._evict(self.table)
+            node = QuadNode(nw.level + 1, nw, ne, sw, se,
+                            nw.population + ne.population + sw.population + se.population)
+            self.table[key] = node
+        return node
+
+    def empty(self, level):
+        while len(self.empties) <= level:
+            if not self.empties:
+                self.empties.append(self.off)
+            else:
+                child = self.empties[-1]
+                self.empties.append(QuadNode(child.level + 1, child, child, child, child, 0))
+        return self.empties[level]
+
+    def _build(self, level, top, left, cells):
+        if not cells:
+            return self.empty(level)
+        if level == 0:
+            return self.on
+        half = 1 << (level - 1)
+        quadrants = ([], [], [], [])
+        for row, col in cells:
+            quadrants[(row >= top + half) * 2 + (col >= left + half)].append((row, col))
+        return self.join(self._build(level - 1, top, left, quadrants[0]),
+                         self._build(level - 1, top, left + half, quadrants[1]),
+                         self._build(level - 1, top + half, left, quadrants[2]),
+                         self._build(level - 1, top + half, left + half, quadrants[3]))
+
+    def _life_4x4(self, node):
+        #base case: level 2 node -> its 2x2 centre after 1 generation
+        cells = [[0] * 4 for _ in range(4)]
+        for q_row, q_col, quadrant in ((0, 0, node.nw), (0, 2, node.ne), (2, 0, node.sw), (2, 2, node.se)):
+            for c_row, c_col, cell in ((0, 0, quadrant.nw), (0, 1, quadrant.ne), (1, 0, quadrant.sw), (1, 1, quadrant.se)):
+                cells[q_row + c_row][q_col + c_col] = cell.population
+        centre = []
+        for row in (1, 2):
+            for col in (1, 2):
+                alive = self.table_rule[cells[row][col]][live_neighbors(cells, row, col)]
+                centre.append(self.on if alive else self.off)
+        return self.join(*centre)
+
+    def successor(self, node, j):
+        '''
+        Centre of node (level k, k >= 2) advanced by 2**min(j, k-2) generations, level k-1 node.
+        '''
+        level = node.level
+        if node.population == 0:
+            return self.empty(level - 1)
+        j = min(j, level - 2)
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+        if level == 2:
+            result = self._life_4x4(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            #9 overlapping sub-squares of level k-1, each advanced by 2**j (or half-speed)
+            c00 = self.successor(nw, j)
+            c01 = self.successor(self.join(nw.ne, ne.nw, nw.se, ne.sw), j)
+            c02 = self.successor(ne, j)
+            c10 = self.successor(self.join(nw.sw, nw.se, sw.nw, sw.ne), j)
+            c11 = self.successor(self.join(nw.se, ne.sw, sw.ne, se.nw), j)
+            c12 = self.successor(self.join(ne.sw, ne.se, se.nw, se.ne), j)
+            c20 = self.successor(sw, j)
+            c21 = self.successor(self.join(sw.ne, se.nw, sw.se, se.sw), j)
+            c22 = self.successor(se, j)
+            if j < level - 2:
+                #already advanced enough: just reassemble the centre
+                result = self.join(self.join(c00.se, c01.sw, c10.ne, c11.nw),
+                                   self.join(c01.se, c02.sw, c11.ne, c12.nw),
+                                   self.join(c10.se, c11.sw, c20.ne, c21.nw),
+                                   self.join(c11.se, c12.sw, c21.ne, c22.nw))
+            else:
+                #full speed: advance the 4 intermediate squares once more
+                result = self.join(self.successor(self.join(c00, c01, c10, c11), j),
+                                   self.successor(self.join(c01, c02, c11, c12), j),
+                                   self.successor(self.join(c10, c11, c20, c21), j),
+                                   self.successor(self.join(c11, c12, c21, c22), j))
+        if len(self.results) >= self.max_nodes:
+            self._evict(self.results)
+        self.results[key] = result
+        return result
+
+    def _expand(self):
+        #same pattern inside a square twice as large (the root becomes the centre)
+        root = self.root
+        empty = self.empty(root.level - 1)
+        self.top -= 1 << (root.level - 1)
+        self.left -= 1 << (root.level - 1)
+        self.root = self.join(self.join(empty, empty, empty, root.nw),
+                              self.join(empty, empty, root.ne, empty),
+                              self.join(empty, root.sw, empty, empty),
+                              self.join(root.se, empty, empty, empty))
+
+    def _is_padded(self):
+        #True if all live cells are inside the centre half of the root
+        root = self.root
+        return (root.nw.population == root.nw.se.population
+                and root.ne.population == root.ne.sw.population
+                and root.sw.population == root.sw.ne.population
+                and root.se.population == root.se.nw.population)
+
+    def jump(self, k):
+        '''
+        Advances the board by 2**k generations with one memoized successor call.
+        '''
+        while self.root.level < k + 2 or not self._is_padded():
+            self._expand()
+        #one more ring: the pattern can grow by at most 2**k cells in 2**k generations
+        self._expand()
+        self.root = self.successor(self.root, k)
+        self.top += 1 << (self.root.level - 1)
+        self.left += 1 << (self.root.level - 1)
+        self.generation += 1 << k
+
+    def advance(self, generations):
+        '''
+        Advances the board by any number of generations (one jump per set bit).
+        '''
+        k = 0
+        while generations:
+            if generations & 1:
+                self.jump(k)
+            generations >>= 1
+            k += 1
+
+    def step(self):
+        self.jump(0)
+
+    def population(self):
+        return self.root.population
+
+    def to_grid(self):
+        grid = [[0] * self.width for _ in range(self.height)]
+        stack = [(self.root, self.top, self.left)]
+        while stack:
+            node, top, left = stack.pop()
+            size = 1 << node.level
+            if (node.population == 0 or top >= self.height or left >= self.width
+                    or top + size <= 0 or left + size <= 0):
+                continue
+            if node.level == 0:
+                grid[top][left] = 1
+                continue
+            half = size >> 1
+            stack.extend(((node.nw, top, left), (node.ne, top, left + half),
+                          (node.sw, top + half, left), (node.se, top + half, left + half)))
+        return grid
+
+
+def hashlife_generation(grid, generation, max_nodes=HASHLIFE_MAX_NODES, rule=None):
+    '''
+    @requires: grid which is a list of lists of 0/1 (e.g. returned by read_input),
+      generation is a non-negative integer,
+      max_nodes is a positive integer, limit of the HashLife caches,
+      rule is a rulestring without B0 or None (then RULE is used)
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: the board (list of lists of 0/1, same size as grid) at the requested generation,
+      computed with HashLife on an unbounded plane (see HashLife)
+
+    TESTS
+    >>> grid = [[0,0,0,0,0],[0,0,0,0,0],[0,1,1,1,0],[0,0,0,0,0],[0,0,0,0,0]]
+    >>> hashlife_generation(grid, 10**6 + 1) == model(grid)
+    True
+    '''
+    life = HashLife(grid, max_nodes, rule)
+    life.advance(generation)
+    return life.to_grid()
+
+
+_SHARED_BOARDS = [] #the 2 boards of the parallel engine, attached once per worker process
+_SHARED_RULE = [None] #rulestring of the parallel engine in the worker process
+
+def _attach_shared_boards(names, shape, rule=None):
+    '''
+    Pool initializer: attaches the worker process to the shared double buffer.
+    '''
+    _SHARED_RULE[0] = rule
+    _SHARED_BOARDS.clear()
+    for name in names:
+        shm = shared_memory.SharedMemory(name=name)
+        _SHARED_BOARDS.append((shm, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)))
+
+
+def _step_stripe(task):
+    '''
+    Worker task: computes rows [start, stop) of the next generation.
+    Only the stripe plus one halo row above and below is read from the current board,
+    the result is written straight into the other shared board.
+    '''
+    src, start, stop = task
+    current = _SHARED_BOARDS[src][1]
+    target = _SHARED_BOARDS[1 - src][1]
+    lo, hi = max(start - 1, 0), min(stop + 1, current.shape[0])
+    #rows next to the cut are wrong (the halo has no neighbours beyond it) and are dropped
+    target[start:stop] = step_numpy(current[lo:hi], _SHARED_RULE[0])[start - lo:stop - lo]
+
+
+def _release_parallel(pool, shms):
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+
+class ParallelEngine:
+    '''
+    Multi-process step engine. The board lives in 2 shared-memory buffers (current and next).
+    Every generation each worker of a multiprocessing pool computes one stripe of rows,
+    reading its one-row halo from the shared current board, so only the
+    (buffer, start, stop) task tuples are pickled, never the grid.
+    The result is identical to step_numpy on the whole board.
+
+    TESTS
+    >>> grid = [[0,1,0,0],[0,0,1,0],[1,1,1,0],[0,0,0,0],[0,0,0,0]]
+    >>> engine = ParallelEngine(grid, workers=2)
+    >>> engine.step()
+    >>> engine.to_grid() == model(grid)
+    True
+    >>> engine.close()
+    '''
+    def __init__(self, grid, workers=None, rule=None):
+        if np is None:
+            raise ImportError('numpy is required for the parallel engine')
+        rule_table(rule) #invalid rulestrings fail here, not in the workers
+        board = np.array(grid, dtype=np.uint8)
+        rows = board.shape[0]
+        self.workers = max(1, min(WORKERS if workers is None else workers, rows))
+        self.current = 0
+        #row stripes of (almost) equal height, one per worker
+        bounds = [rows * idx // self.workers for idx in range(self.workers + 1)]
+        self.stripes = list(zip(bounds[:-1], bounds[1:]))
+        self.shms = []
+        self.boards = []
+        try:
+            for _ in range(2):
+                self.shms.append(shared_memory.SharedMemory(create=True, size=max(board.nbytes, 1)))
+            self.boards = [np.ndarray(board.shape, dtype=np.uint8, buffer=shm.buf) for shm in self.shms]
+            self.boards[0][:] = board
+            self.pool = multiprocessing.Pool(self.workers, initializer=_attach_shared_boards,
+                                             initargs=([shm.name for shm in self.shms], board.shape, rule))
+        except BaseException:
+            self.boards = [] #views must be released before the shared memory is closed
+            _release_parallel(None, self.shms)
+            raise
+        self._finalizer = weakref.finalize(self, _release_parallel, self.pool, self.shms)
+
+    def step(self):
+        self.pool.map(_step_stripe, [(self.current, start, stop) for start, stop in self.stripes])
+        self.current = 1 - self.current
+
+    def to_grid(self):
+        return self.boards[self.current].tolist()
+
+    def close(self):
+        self.boards = []  #views must be released before the shared memory is closed
+        self._finalizer()
+
+
+def benchmark_parallel_scaling(size=2000, generations=10, max_workers=None, seed=0):
+    '''
+    @requires: size, generations are positive integers,
+      max_workers is a positive integer or None (then WORKERS is used)
+    @modifies: None
+    @effects: prints the step time and speed-up of ParallelEngine for 1..max_workers processes
+      on a random size x size board
+    @raises: None
+    @returns: a list of (workers, seconds per generation) tuples
+    '''
+    rng = np.random.default_rng(seed)
+    grid = rng.integers(0, 2, size=(size, size), dtype=np.uint8).tolist()
+    results = []
+    for workers in range(1, (max_workers or WORKERS) + 1):
+        engine = ParallelEngine(grid, workers)
+        try:
+            start = time.perf_counter()
+            for _ in range(generations):
+                engine.step()
+            elapsed = (time.perf_counter() - start) / generations
+        finally:
+            engine.close()
+        results.append((workers, elapsed))
+        print(f'workers={workers:3d}  {elapsed * 1000:9.2f} ms/generation  speed-up x{results[0][1] / elapsed:.2f}')
+    return results
+
+
+class FusedEngine:
+    '''
+    Numpy step engine that also keeps the age grid and per-generation statistics.
+    One step computes the next state, the updated ages and the counters together,
+    writing into buffers allocated once (double buffers for the board and the ages),
+    instead of building a new grid, a new age grid and walking the board again.
+    After every step, stats holds: births, deaths, population and the bounding box
+    (top, left, bottom, right) of the live cells, inclusive, or None for an empty board.
+
+    TESTS
+    >>> engine = FusedEngine([[0,1,0],[0,1,0],[0,1,0]])
+    >>> engine.step()
+    >>> engine.to_grid(), engine.to_age_grid()
+    ([[0, 0, 0], [1, 1, 1], [0, 0, 0]], [[0, 0, 0], [1, 2, 1], [0, 0, 0]])
+    >>> engine.stats
+    {'births': 2, 'deaths': 2, 'population': 3, 'bbox': (1, 0, 1, 2)}
+    '''
+    def __init__(self, grid, rule=None):
+        if np is None:
+            raise ImportError('numpy is required for the fused engine')
+        board = np.array(grid, dtype=np.uint8)
+        rows, cols = board.shape
+        #rule table packed into the bits of one int: bit (9 * state + live neighbours) is the next state
+        self.rule_bits = np.uint32(sum(int(value) << idx for idx, value in enumerate(_numpy_rule_table(rule))))
+        #boards are stored inside a ring of dead cells, so neighbour sums need no padding copy
+        self.padded = [np.zeros((rows + 2, cols + 2), dtype=np.uint8) for _ in range(2)]
+        self.boards = [padded[1:-1, 1:-1] for padded in self.padded]
+        self.ages = [np.zeros((rows, cols), dtype=np.uint32) for _ in range(2)]
+        self.index = np.empty((rows, cols), dtype=np.uint8)
+        self.lookup = np.empty((rows, cols), dtype=np.uint32)
+        self.changed = np.empty((rows, cols), dtype=bool)
+        self.boards[0][:] = board
+        self.ages[0][:] = board #same as init_age_grid
+        self.current = 0
+        self.population = int(np.count_nonzero(board))
+        self.stats = {'births': 0, 'deaths': 0, 'population': self.population, 'bbox': self._bbox(self.boards[0])}
+
+    def set_age_grid(self, age_grid):
+        '''
+        Replaces the ages of the current board, e.g. when a run is resumed from a checkpoint.
+        '''
+        self.ages[self.current][:] = age_grid
+
+    @staticmethod
+    def _bbox(board):
+        live_rows = np.flatnonzero(board.max(axis=1))
+        if len(live_rows) == 0:
+            return None
+        live_cols = np.flatnonzero(board.max(axis=0))
+        return (int(live_rows[0]), int(live_cols[0]), int(live_rows[-1]), int(live_cols[-1]))
+
+    def step(self):
+        current, target = self.current, 1 - self.current
+        padded, board, next_board = self.padded[current], self.boards[current], self.boards[target]
+        rows, cols = board.shape
+        index = self.index
+
+        #rule table index: 9 * state + live neighbours
+        np.multiply(board, 9, out=index)
+        for d_row in range(3):
+            for d_col in range(3):
+                if d_row != 1 or d_col != 1:
+                    np.add(index, padded[d_row:d_row + rows, d_col:d_col + cols], out=index)
+        #table lookup as a shift of rule_bits (fancy indexing would allocate an int64 index copy)
+        np.right_shift(self.rule_bits, index, out=self.lookup)
+        np.bitwise_and(self.lookup, 1, out=self.lookup)
+        np.copyto(next_board, self.lookup, casting='unsafe')
+
+        #ages: +1 for live cells, 0 for dead ones
+        next_age = self.ages[target]
+        np.add(self.ages[current], 1, out=next_age)
+        np.multiply(next_age, next_board, out=next_age)
+
+        #every changed cell is a birth or a death, the population change tells how many of each
+        np.not_equal(board, next_board, out=self.changed)
+        changed = int(np.count_nonzero(self.changed))
+        population = int(np.count_nonzero(next_board))
+        delta = population - self.population
+        self.stats = {'births': (changed + delta) // 2,
+                      'deaths': (changed - delta) // 2,
+                      'population': population,
+                      'bbox': self._bbox(next_board)}
+        self.population = population
+        self.current = target
+
+    def to_grid(self):
+        return self.boards[self.current].tolist()
+
+    def to_age_grid(self):
+        return self.ages[self.current].tolist()
+
+
+ENGINES = {'python': PythonEngine,
+           'numpy': NumpyEngine,
+           'bitboard': BitGrid,
+           'sparse': SparseEngine,
+           'parallel': ParallelEngine,
+           'fused': FusedEngine,
+           }
+
+def make_engine(grid, engine=None, rule=None):
+    '''
+    @requires: grid which is a list of lists of 0/1,
+      engine is a key of ENGINES or None (then ENGINE is used),
+      rule is a rulestring or None (then RULE is used)
+    @modifies: None
+    @effects: None
+    @raises: ValueError if the engine name or the rule is invalid
+    @returns: an engine object initialized with grid
+
+    TESTS
+    >>> make_engine([[1]], 'numpy').to_grid()
+    [[1]]
+    >>> make_engine([[1]], 'abacus')
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown engine 'abacus', expected one of: python, numpy, bitboard, sparse, parallel, fused
+    '''
+    name = ENGINE if engine is None else engine
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine '{name}', expected one of: {', '.join(ENGINES)}")
+    return ENGINES[name](grid, rule=rule)
+
+
+def random_soups(count, rows, cols, density=None, seed=None):
+    '''
+    @requires: count, rows, cols are positive integers, density is in [0, 1] (None - SOUP_DENSITY),
+      seed is an int, a numpy Generator (the soups continue its stream) or None (then the soups
+      are not reproducible), numpy must be installed
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: a (count, rows, cols) uint8 array of random soups; the same seed gives the same soups
+
+    TESTS
+    >>> soups = random_soups(2, 3, 4, seed=7)
+    >>> soups.shape, bool((soups == random_soups(2, 3, 4, seed=7)).all())
+    ((2, 3, 4), True)
+    '''
+    density = SOUP_DENSITY if density is None else density
+    rng = np.random.default_rng(seed)
+    return (rng.random((count, rows, cols)) < density).astype(np.uint8)
+
+
+def simulate_ensemble(boards, generations=None, rule=None, max_period=None):
+    '''
+    @requires: boards is a (K, rows, cols) array of 0/1, rule as in step_numpy,
+      max_period as CYCLE_MAX_PERIOD (None - ENSEMBLE_MAX_PERIOD), numpy must be installed
+    @modifies: None
+    @effects: advances all the boards together with vectorized steps (up to generations,
+      None - GENERATIONS). A board that repeats one of its last max_period states
+      is dropped from the batch, so only the boards still changing are stepped.
+    @raises: None
+    @returns: a list with a dictionary for every board:
+      {'board': index in boards, 'populations': live cells of generations 0..the last simulated one,
+       'stable_at': the generation that repeated an earlier one or None, 'period': period or None}
+
+    TESTS
+    >>> boards = np.array([[[0,0,0],[1,1,1],[0,0,0]], [[1,1,0],[1,1,0],[0,0,0]], [[1,0,0],[0,0,0],[0,0,1]]])
+    >>> for result in simulate_ensemble(boards, 5):
+    ...     print(result)
+    {'board': 0, 'populations': [3, 3, 3], 'stable_at': 2, 'period': 2}
+    {'board': 1, 'populations': [4, 4], 'stable_at': 1, 'period': 1}
+    {'board': 2, 'populations': [2, 0, 0], 'stable_at': 2, 'period': 1}
+    '''
+    generations = GENERATIONS if generations is None else generations
+    max_period = ENSEMBLE_MAX_PERIOD if max_period is None else max_period
+    boards = np.asarray(boards, dtype=np.uint8)
+    count = len(boards)
+    ids = np.arange(count) #positions of the boards still in the batch
+    populations = np.zeros((count, generations + 1), dtype=np.int64)
+    populations[:, 0] = np.count_nonzero(boards, axis=(1, 2))
+    last = np.full(count, generations)
+    stable_at = [None] * count
+    periods = [None] * count
+    history = collections.deque([boards] if max_period > 0 else [], maxlen=max_period)
+    for gen in range(1, generations + 1):
+        if len(ids) == 0:
+            break
+        boards = step_numpy(boards, rule)
+        populations[ids, gen] = np.count_nonzero(boards, axis=(1, 2))
+        period = np.zeros(len(ids), dtype=np.intp) #0 - still changing
+        for distance, prev in enumerate(reversed(history), 1):
+            same = (boards == prev).all(axis=(1, 2))
+            period[same & (period == 0)] = distance
+        stable = period > 0
+        if stable.any():
+            for idx, distance in zip(ids[stable].tolist(), period[stable].tolist()):
+                stable_at[idx], periods[idx] = gen, distance
+            last[ids[stable]] = gen
+            changing = ~stable
+            ids, boards = ids[changing], boards[changing]
+            history = collections.deque((prev[changing] for prev in history), maxlen=max_period)
+        history.append(boards)
+    return [{'board': idx, 'populations': populations[idx, :last[idx] + 1].tolist(),
+             'stable_at': stable_at[idx], 'period': periods[idx]} for idx in range(count)]
+
+
+def run_ensemble(count, rows, cols, generations=None, density=None, seed=None, rule=None,
+                 batch_size=None, max_period=None):
+    '''
+    @requires: the arguments as in random_soups and simulate_ensemble,
+      batch_size is a positive integer (None - ENSEMBLE_BATCH)
+    @modifies: None
+    @effects: simulates count seeded random soups, batch_size boards at a time
+      (the soups do not depend on batch_size)
+    @raises: None
+    @returns: the results of simulate_ensemble for all the soups, 'board' is the soup number
+
+    TESTS
+    >>> small = run_ensemble(10, 8, 8, 20, seed=1, batch_size=3)
+    >>> small == run_ensemble(10, 8, 8, 20, seed=1), [result['board'] for result in small][-2:]
+    (True, [8, 9])
+    '''
+    batch_size = ENSEMBLE_BATCH if batch_size is None else batch_size
+    rng = np.random.default_rng(seed) #one stream for all the batches
+    results = []
+    for first in range(0, count, batch_size):
+        boards = random_soups(min(batch_size, count - first), rows, cols, density, rng)
+        for result in simulate_ensemble(boards, generations, rule, max_period):
+            result['board'] += first
+            results.append(result)
+    return results
+
+
+def ensemble_summary(results):
+    '''
+    @requires: results of simulate_ensemble/run_ensemble
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: {'boards', 'stabilised': number of boards that repeated a state,
+      'mean_stable_at': mean generation of stabilisation of these boards (None if there are none),
+      'mean_final_population': mean population of the last simulated generation,
+      'periods': {period: number of boards}}
+
+    TESTS
+    >>> ensemble_summary([{'board': 0, 'populations': [3, 4, 4], 'stable_at': 2, 'period': 1},
+    ...                   {'board': 1, 'populations': [5, 2, 3], 'stable_at': None, 'period': None}])
+    {'boards': 2, 'stabilised': 1, 'mean_stable_at': 2.0, 'mean_final_population': 3.5, 'periods': {1: 1}}
+    '''
+    stable = [result['stable_at'] for result in results if result['stable_at'] is not None]
+    return {'boards': len(results),
+            'stabilised': len(stable),
+            'mean_stable_at': sum(stable) / len(stable) if stable else None,
+            'mean_final_population': (sum(result['populations'][-1] for result in results) / len(results)
+                                      if results else None),
+            'periods': dict(sorted(collections.Counter(result['period'] for result in results
+                                                       if result['period'] is not None).items()))}
+
+
+def write_ensemble(results, filename):
+    '''
+    @requires: results of simulate_ensemble/run_ensemble, filename of the output file
+    @modifies: writes filename (CSV, ';'-separated like the grids) to file system
+    @effects: one line per board: board;stable_at;period;final population;population series (space-separated),
+      empty fields for boards that did not stabilise
+    @raises: IOError if cannot write the file
+    @returns: None
+    '''
+    with open(filename, 'w') as f:
+        f.write('board;stable_at;period;final_population;populations\n')
+        for result in results:
+            stable_at = '' if result['stable_at'] is None else result['stable_at']
+            period = '' if result['period'] is None else result['period']
+            f.write(f"{result['board']};{stable_at};{period};{result['populations'][-1]};"
+                    f"{' '.join(map(str, result['populations']))}\n")
+
+
+CELL_DIGITS = bytes.maketrans(b'01', b'\x00\x01') #b'0'/b'1' -> byte values 0/1
+CELLS_DIGITS = bytes.maketrans(b'.O*', b'\x00\x01\x01') #plaintext pattern cells -> 0/1
+
+def _parse_csv_line(stripped, line_num):
+    '''
+    Slow path of read_input for a line that is not a plain '0;1;...' row:
+    the values are parsed one by one with int(), errors are reported with the line number.
+    '''
+    try:
+        data_row = [int(elem) for elem in stripped.split(';')]
+    except ValueError:
+        raise ValueError(f'Line_num {line_num}:non-integer value in {stripped}')
+
+    for val in data_row:
+        if val not in (0,1):
+            raise ValueError(f'Line_num {line_num}: invalid value {val}, expected 0 or 1')
+    return data_row
+
+
+def read_input(filename):
+    '''
+    @requires: a filename of the valid CSV-file with rows of 0/1 separated by semicolon.
+      Each line must have the same number of elements.
+      File must exist and be readable from the same directory as the executed .py file
+    @modifies: None
+    @effects: None
+    @raises: FileNotFoundError if the file not found.
+      ValueError if the format invalid:
+          - the file is empty (contains no valid rows)
+          - any line contains non-integer values,
+          - any value is not 0 or 1,
+          - lines have inconsistent lengths.
+    @returns: a grid which is a list of lists of integers (0/1)
+      The file is read line by line as bytes, a plain row such as b'0;1;1' is validated and
+      converted as a whole (bytes.translate), other lines go through the per-value check.
+
+    TESTS
+    >>> import os
+    >>> test_file = 'test_read.csv'
+    >>> try:
+    ...     with open(test_file, 'w') as f: _ = f.write('1;0;1\\n\\n 0 ; 1;01\\n')
+    ...     read_input(test_file)
+    ... finally:
+    ...     os.remove(test_file)
+    [[1, 0, 1], [0, 1, 1]]
+    >>> try:
+    ...     with open(test_file, 'w') as f: _ = f.write('1;0\\n1;2\\n')
+    ...     read_input(test_file)
+    ... finally:
+    ...     os.remove(test_file)
+    Traceback (most recent call last):
+    ...
+    ValueError: Line_num 1: invalid value 2, expected 0 or 1
+    '''
+    grid = []
+    width = None
+    try:
+        input_file = open(filename, 'rb')
+    except FileNotFoundError:
+        raise FileNotFoundError(f'File {filename} not found in the current directory.')
+
+    with input_file:
+        for line_num, line in enumerate(input_file):
+            stripped = line.strip() #by default strip removes whitespace characters
+            if not stripped:
+                continue #skip empty lines
+            cells = stripped[::2]
+            #fast path: 0/1 at even positions, ';' at odd positions
+            if (len(stripped) % 2 == 1 and not cells.translate(None, b'01')
+                    and stripped.count(b';') == len(stripped) // 2):
+                data_row = list(cells.translate(CELL_DIGITS))
+            else:
+                data_row = _parse_csv_line(stripped.decode(), line_num)
+
+            if width is not None and len(data_row) != width: #length of the current list is not equal to the previously appended one
+                raise ValueError(f'Line_num {line_num}: inconsistent number of columns (expected {width}, got {len(data_row)})')
+            width = len(data_row)
+            grid.append(data_row)
+    #Empty/whitespace-only file check
+    if not grid:
+        raise ValueError(f'The file {filename} is empty or contains no valid data rows')
+    
+    return grid
+
+
+def read_cells(filename):
+    '''
+    @requires: a filename of a plaintext pattern ('.cells'): lines starting with '!' are comments,
+      every other line is a row where '.' is a dead cell and 'O' (or '*') a live one.
+      Shorter rows are padded with dead cells.
+    @modifies: None
+    @effects: None
+    @raises: FileNotFoundError if the file not found.
+      ValueError if the file contains no rows or an unknown character
+    @returns: a grid which is a list of lists of integers (0/1)
+
+    TESTS
+    >>> import os
+    >>> try:
+    ...     with open('test.cells', 'w') as f: _ = f.write('!Name: Glider\\n.O\\n..O\\nOOO\\n')
+    ...     read_cells('test.cells')
+    ... finally:
+    ...     os.remove('test.cells')
+    [[0, 1, 0], [0, 0, 1], [1, 1, 1]]
+    '''
+    rows = []
+    try:
+        input_file = open(filename, 'rb')
+    except FileNotFoundError:
+        raise FileNotFoundError(f'File {filename} not found in the current directory.')
+    with input_file:
+        for line_num, line in enumerate(input_file):
+            stripped = line.rstrip()
+            if stripped.startswith(b'!'):
+                continue
+            unknown = stripped.translate(None, b'.O*')
+            if unknown:
+                raise ValueError(f'Line_num {line_num}: invalid character {unknown[:1].decode(errors="replace")!r}, expected . or O')
+            rows.append(stripped.translate(CELLS_DIGITS))
+    while rows and not rows[-1]:
+        rows.pop() #trailing empty lines
+    width = max((len(row) for row in rows), default=0)
+    if not rows or width == 0:
+        raise ValueError(f'The file {filename} is empty or contains no valid data rows')
+    return [list(row) + [0] * (width - len(row)) for row in rows]
+
+
+def _rle_header(filename, line_num, line):
+    #'x = <cols>, y = <rows>[, rule = ...]' -> (cols, rows, rulestring or None)
+    header = {}
+    for item in line.split(','):
+        key, _, value = item.partition('=')
+        header[key.strip()] = value.strip()
+    try:
+        cols, rows = int(header['x']), int(header['y'])
+    except (KeyError, ValueError):
+        raise ValueError(f'Line_num {line_num}: invalid RLE header {line}')
+    if cols <= 0 or rows <= 0:
+        raise ValueError(f'The file {filename} is empty or contains no valid data rows')
+    return cols, rows, header.get('rule') or None
+
+
+def read_rle(filename, rule=None):
+    '''
+    @requires: a filename of a pattern in the RLE format: '#' comment lines, a header
+      'x = <cols>, y = <rows>[, rule = ...]', then runs of '<count><tag>' where tag 'b' is
+      a dead cell, 'o' (or any other letter) a live one, '$' ends a row and '!' ends the pattern.
+      rule is the rulestring the pattern will run under (None - RULE)
+    @modifies: None
+    @effects: None
+    @raises: FileNotFoundError if the file not found.
+      ValueError if the header is missing or invalid, the pattern does not fit into x by y,
+      or the header declares a rule that differs from rule (see pattern_rule)
+    @returns: a grid (list of lists of 0/1) of y rows and x columns
+
+    TESTS
+    >>> import os
+    >>> try:
+    ...     with open('test.rle', 'w') as f: _ = f.write('#N Glider\\nx = 3, y = 4, rule = B3/S23\\nbo$2bo$3o!\\n')
+    ...     read_rle('test.rle')
+    ...     read_rle('test.rle', '23/3') == read_rle('test.rle') #the same rule in the legacy notation
+    ...     read_rle('test.rle', 'B36/S23')
+    ... except ValueError as err:
+    ...     print(err)
+    ... finally:
+    ...     os.remove('test.rle')
+    [[0, 1, 0], [0, 0, 1], [1, 1, 1], [0, 0, 0]]
+    True
+    The pattern test.rle is for the rule B3/S23, not B36/S23
+    '''
+    try:
+        input_file = open(filename, 'r')
+    except FileNotFoundError:
+        raise FileNotFoundError(f'File {filename} not found in the current directory.')
+    grid = None
+    row = col = 0
+    count = ''
+    with input_file:
+        for line_num, line in enumerate(input_file):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            if grid is None:
+                cols, rows, declared = _rle_header(filename, line_num, stripped)
+                active = RULE if rule is None else rule
+                if declared is not None and parse_rule(declared) != parse_rule(active):
+                    raise ValueError(f'The pattern {filename} is for the rule {declared}, not {active}')
+                grid = [[0] * cols for _ in range(rows)]
+                continue
+            for char in stripped:
+                if char.isdigit():
+                    count += char
+                    continue
+                run = int(count) if count else 1
+                count = ''
+                if char == '!':
+                    return grid
+                if char == '$':
+                    row, col = row + run, 0
+                elif char.isalpha():
+                    if char != 'b':
+                        if row >= rows or col + run > cols:
+                            raise ValueError(f'Line_num {line_num}: pattern does not fit into {cols}x{rows}')
+                        grid[row][col:col + run] = [1] * run
+                    col += run
+                elif not char.isspace():
+                    raise ValueError(f'Line_num {line_num}: invalid character {char!r}')
+    if grid is None:
+        raise ValueError(f'The file {filename} is empty or contains no valid data rows')
+    return grid
+
+
+def read_pattern(filename, rule=None):
+    '''
+    @requires: a filename of a seed in one of the formats: '.rle' (read_rle),
+      '.cells' (read_cells), otherwise the semicolon CSV (read_input);
+      rule is the rulestring the seed will run under (None - RULE)
+    @modifies: None
+    @effects: None
+    @raises: as the selected reader
+    @returns: a grid which is a list of lists of integers (0/1)
+    '''
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.rle':
+        return read_rle(filename, rule)
+    if extension == '.cells':
+        return read_cells(filename)
+    return read_input(filename)
+
+
+def pattern_rule(filename):
+    '''
+    @requires: a filename as in read_pattern
+    @modifies: None
+    @effects: None
+    @raises: FileNotFoundError if the file not found, ValueError if the RLE header is invalid
+    @returns: the rulestring declared by the 'rule = ...' entry of an RLE header, or None
+      (no entry, or a format without rules)
+
+    TESTS
+    >>> import os
+    >>> try:
+    ...     with open('test.rle', 'w') as f: _ = f.write('#N HighLife replicator\\nx = 1, y = 1, rule = B36/S23\\no!\\n')
+    ...     pattern_rule('test.rle'), read_pattern('test.rle', pattern_rule('test.rle'))
+    ... finally:
+    ...     os.remove('test.rle')
+    ('B36/S23', [[1]])
+    '''
+    if os.path.splitext(filename)[1].lower() != '.rle':
+        return None
+    try:
+        input_file = open(filename, 'r')
+    except FileNotFoundError:
+        raise FileNotFoundError(f'File {filename} not found in the current directory.')
+    with input_file:
+        for line_num, line in enumerate(input_file):
+            stripped = line.strip()
+            if stripped and not stripped.startswith('#'):
+                return _rle_header(filename, line_num, stripped)[2]
+    return None
+
+
+def write_output(grid, filename):
+    '''
+    @requires: grid which is a list of lists of integers (0/1),
+               filename to use for naming of the output file
+    @modifies: writes CSV-file to file system (the current directory)
+    @effects: creates or overwrites filename with grid in CSV format (semicolon-separated)
+    @raises: IOError if cannot write the file
+    @returns: None
+    
+    TESTS
+    >>> grid = [[1,0],[0,1]]
+    >>> import os
+    >>> test_file = 'test_write.csv'
+    >>> try:
+    ...     write_output(grid, test_file)
+    ...     with open(test_file, 'r') as f: content = f.read()
+    ...     content
+    ... finally:
+    ...     if os.path.exists(test_file):
+    ...         os.remove(test_file)
+    '1;0\\n0;1\\n'
+    '''
+    with open(filename, 'w') as f:
+        for row in grid:
+            f.write(';'.join([str(elem) for elem in row]) + '\n')
+        
+def write_summary(text, filename):
+    '''
+    @requires: text is a string, filename to use for naming of the output file
+    @modifies: writes a text file to file system
+    @effects: creates or overwrites filename with text and a newline
+    @raises: IOError if cannot write the file
+    @returns: None
+    '''
+    with open(filename, 'w') as f:
+        f.write(text + '\n')
+
+def init_age_grid(grid):
+    '''
+    @requires: grid is a list of lists of 0/1
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: age_grid with same dimensions as grid
+
+    TESTS:
+    >>> grid = [[1,0],[0,1]]
+    >>> init_age_grid(grid)
+    [[1, 0], [0, 1]]
+    '''
+    #created from scratch because age grid defines life expectancy, while grid - only current cell state
+    return [[1 if cell == 1 else 0 for cell in row] for row in grid]
+
+
+def update_age_grid(grid, prev_age_grid):
+    '''
+    @requires: grid and prev_age_grid have same dimensions;
+               grid contains only 0/1;
+               prev_age_grid contains non-negative integers
+    @modifies: None
+    @effects: None
+    @raises: IndexError if dimensions mismatch
+    @returns: new age_grid where alive cells increment age, dead cells reset to 0.
+
+    TESTS:
+    >>> grid = [[1,0],[1,1]]
+    >>> prev = [[2,0],[3,1]]
+    >>> update_age_grid(grid, prev)
+    [[3, 0], [4, 2]]
+    '''
+    rows = len(grid)
+    cols = len(grid[0])
+    new_age = [[0 for _ in range(cols)] for _ in range(rows)]
+    for r in range(rows):
+        for c in range(cols):
+            if grid[r][c] == 1:
+                new_age[r][c] = prev_age_grid[r][c] + 1
+    return new_age
+
+def write_png(grid, age_grid, filename):
+    '''
+    @requires: grid and age_grid are same-sized lists of lists,
+               grid contains 0/1,
+               age_grid contains non-negative integers,
+               filename to use for naming of the output file.
+    @modifies: writes PNG file to file system (the current directory)
+    @effects: saves image as PNG with age-based shading. Alive cells are shaded versions of BASE_COLOR (RGB).
+              Darkest shade is 10% brightness. Dead cells are white.
+    @raises: IOError if cannot save
+    @returns: None
+
+    TESTS:
+    >>> grid = [[1,0],[1,1]]
+    >>> age = [[1,0],[5,10]]
+    >>> import os
+    >>> test_file = 'test_shade.png'
+    >>> try:
+    ...     write_png(grid, age, test_file)
+    ...     assert os.path.exists(test_file)
+    ... finally:
+    ...     if os.path.exists(test_file):
+    ...         os.remove(test_file)
+    '''    
+    rows, cols = len(grid), len(grid[0])
+    
+    max_age = GENERATIONS
+    
+    cell_size = CELL_SIZE
+    line_width = BORDER_WIDTH
+    total_width = cols * (cell_size + line_width) + line_width
+    total_height = rows *(cell_size + line_width) + line_width
+    
+    im = Image.new(mode='RGB', size=(total_width, total_height), color=(255, 255, 255)) #white background
+    #im.show()
+    #use ImageDraw-object to enable drawing
+    draw = ImageDraw.Draw(im)
+
+    #draw grid lines in light-gray
+    #vertical
+    for col in range(cols + 1):
+        x = col * cell_size + col * line_width
+        draw.line([(x, 0), (x, total_height)], fill=(200, 200, 200), width=line_width)
+
+    #horizontal
+    for row in range(rows + 1):
+        y = row * cell_size + row * line_width
+        draw.line([(0, y), (total_width, y)], fill=(200, 200, 200), width=line_width)
+
+    #color live cells
+    r_base, g_base, b_base = BASE_COLOR
+    for row in range(rows):
+        for col in range(cols):
+            if grid[row][col] == 1:
+                age = age_grid[row][col]
+                factor = max(0.1, 1.0 - min(age / max_age, 0.9))
+                shaded_color = (
+                    int(r_base * factor),
+                    int(g_base * factor),
+                    int(b_base * factor)
+                )
+
+                x0 = col * cell_size + col * line_width + line_width
+                y0 = row * cell_size + row * line_width + line_width
+                x1 = x0 + cell_size - 1
+                y1 = y0 + cell_size - 1
+                draw.rectangle([x0, y0, x1, y1], fill=shaded_color)
+
+    # draw.rectangle([(BORDER_WIDTH, BORDER_WIDTH), 
+    #                 (BORDER_WIDTH + CELL_SIZE, BORDER_WIDTH + CELL_SIZE)],
+    #                fill='#00FF00', outline='#00FF00')
+    
+    im.save(filename)
+
+
+
+def age_palette(max_age=None):
+    '''
+    @requires: max_age is a positive integer or None (then GENERATIONS is used)
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: a list of max_age + 1 RGB tuples, item k is the shade of BASE_COLOR for a cell of age k
+      (same formula as in write_png; every age >= max_age has the darkest shade)
+
+    TESTS
+    >>> palette = age_palette(10)
+    >>> palette[1], palette[5], palette[10]
+    ((0, 229, 0), (0, 127, 0), (0, 25, 0))
+    '''
+    max_age = GENERATIONS if max_age is None else max_age
+    r_base, g_base, b_base = BASE_COLOR
+    palette = []
+    for age in range(max_age + 1):
+        factor = max(0.1, 1.0 - min(age / max_age, 0.9))
+        palette.append((int(r_base * factor), int(g_base * factor), int(b_base * factor)))
+    return palette
+
+
+def _line_mask(cells, cell_size, line_width):
+    '''
+    Returns a bool array over one axis of the image: True for the pixels covered by grid lines.
+    Lines cover the same pixels as ImageDraw.line of width line_width in write_png.
+    '''
+    pitch = cell_size + line_width
+    is_line = np.zeros(cells * pitch + line_width, dtype=bool)
+    first = -((line_width - 1) // 2) #ImageDraw centres wide lines on the coordinate
+    for idx in range(cells + 1):
+        start = idx * pitch + first
+        is_line[max(start, 0):max(start + line_width, 0)] = True
+    return is_line
+
+
+def _cell_index(cells, cell_size, line_width):
+    '''
+    Returns an int array over one axis of the image: index of the cell covering every pixel, -1 if none.
+    '''
+    pitch = cell_size + line_width
+    offsets = np.arange(cells * pitch + line_width) - line_width
+    return np.where((offsets >= 0) & (offsets % pitch < cell_size), offsets // pitch, -1)
+
+
+def _render_array(alive, cell_values, line_value, background_value):
+    '''
+    Builds the image of the board as an array of shape (height, width, channels):
+    cell_values[row, col] for the pixels of live cells, line_value for grid lines,
+    background_value elsewhere (the same layout as write_png).
+    Every distinct pixel row (a row crossing cell row r, the same row under a horizontal line,
+    a plain background row, a line row) is built once, then all image rows are copied
+    from these templates in one take.
+    '''
+    rows, cols = alive.shape
+    channels = cell_values.shape[2]
+    cell_size, line_width = CELL_SIZE, BORDER_WIDTH
+    pitch = cell_size + line_width
+    x_line = _line_mask(cols, cell_size, line_width)
+    y_line = _line_mask(rows, cell_size, line_width)
+
+    #row templates: [0, rows) cell rows, [rows, 2*rows) cell rows under a horizontal line,
+    #2*rows background row (with vertical lines), 2*rows + 1 line row
+    templates = np.empty((2 * rows + 2, len(x_line), channels), dtype=np.uint8)
+    templates[:rows] = np.where(x_line[:, None], line_value, background_value)
+    templates[rows:] = line_value
+    templates[2 * rows] = templates[0]
+    cells_x = templates[:2 * rows, line_width:].reshape(2, rows, cols, pitch, channels)[:, :, :, :cell_size]
+    np.copyto(cells_x, cell_values[None, :, :, None, :], where=alive[None, :, :, None, None])
+
+    y_cell = _cell_index(rows, cell_size, line_width)
+    source = np.where(y_cell >= 0, y_cell + rows * y_line, 2 * rows + y_line)
+    return templates[source]
+
+
+def render_frame(grid, age_grid, max_age=None):
+    '''
+    @requires: grid and age_grid are same-sized lists of lists (or 2-D arrays),
+               grid contains 0/1, age_grid contains non-negative integers,
+               max_age is a positive integer or None (then GENERATIONS is used),
+               numpy must be installed
+    @modifies: None
+    @effects: None
+    @raises: ImportError if numpy is not installed
+    @returns: a PIL RGB image identical to the one saved by write_png.
+      The image is built with block operations (see _render_array) instead of one ImageDraw
+      call per line and per live cell, cell colours are looked up in age_palette.
+
+    TESTS
+    >>> grid, age = [[1,0],[1,1]], [[1,0],[5,10]]
+    >>> image = render_frame(grid, age)
+    >>> image.size
+    (46, 46)
+    >>> image.getpixel((0, 0)), image.getpixel((2, 2)), image.getpixel((24, 2)), image.getpixel((43, 43))
+    ((200, 200, 200), (0, 229, 0), (255, 255, 255), (0, 25, 0))
+    '''
+    if np is None:
+        raise ImportError('numpy is required for the fast renderer')
+    palette = np.array(age_palette(max_age), dtype=np.uint8)
+    alive = np.asarray(grid, dtype=bool)
+    colors = palette[np.minimum(np.asarray(age_grid), len(palette) - 1)]
+    pixels = _render_array(alive, colors, np.array((200, 200, 200), dtype=np.uint8),
+                           np.array((255, 255, 255), dtype=np.uint8))
+    return Image.frombuffer('RGB', (pixels.shape[1], pixels.shape[0]), pixels, 'raw', 'RGB', 0, 1)
+
+
+def write_png_fast(grid, age_grid, filename):
+    '''
+    @requires: same as write_png
+    @modifies: writes PNG file to file system (the current directory)
+    @effects: saves the same image as write_png, rendered by render_frame.
+      Falls back to write_png if numpy is not installed.
+    @raises: IOError if cannot save
+    @returns: None
+
+    TESTS:
+    >>> grid = [[1,0,0],[1,1,0]]
+    >>> age = [[1,0,0],[4,12,0]]
+    >>> import os
+    >>> try:
+    ...     write_png(grid, age, 'test_slow.png')
+    ...     write_png_fast(grid, age, 'test_fast.png')
+    ...     Image.open('test_slow.png').tobytes() == Image.open('test_fast.png').tobytes()
+    ... finally:
+    ...     for test_file in ('test_slow.png', 'test_fast.png'):
+    ...         if os.path.exists(test_file):
+    ...             os.remove(test_file)
+    True
+    '''
+    if np is None:
+        write_png(grid, age_grid, filename)
+        return
+    render_frame(grid, age_grid).save(filename)
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+class AnimationWriter:
+    '''
+    Streams generations into one animated PNG (APNG) file.
+    Frames are added one by one with add_frame(grid, age_grid) and written immediately,
+    only the previous frame is kept in memory. The first frame is stored in full,
+    every next frame only stores the bounding box of the pixels that changed,
+    with unchanged pixels inside the box left transparent.
+    The image uses a fixed palette: transparent, white, light-gray and the age shades of
+    age_palette(), so cells are stored as 1-byte palette indices.
+    close() must be called to finish the file.
+
+    TESTS
+    >>> import os
+    >>> test_file = 'test_animation.png'
+    >>> grid = [[0,0,0],[1,1,1],[0,0,0]]
+    >>> age = init_age_grid(grid)
+    >>> try:
+    ...     animation = AnimationWriter(test_file)
+    ...     expected = []
+    ...     for _ in range(3):
+    ...         animation.add_frame(grid, age)
+    ...         expected.append(render_frame(grid, age).tobytes())
+    ...         grid = model(grid)
+    ...         age = update_age_grid(grid, age)
+    ...     animation.close()
+    ...     image = Image.open(test_file)
+    ...     frames = []
+    ...     for idx in range(image.n_frames):
+    ...         image.seek(idx)
+    ...         frames.append(image.convert('RGB').tobytes())
+    ...     image.close()
+    ...     image.n_frames, frames == expected
+    ... finally:
+    ...     if os.path.exists(test_file):
+    ...         os.remove(test_file)
+    (3, True)
+    '''
+    def __init__(self, filename, delay_ms=None, max_age=None):
+        if np is None:
+            raise ImportError('numpy is required for the animation export')
+        self.delay_ms = FRAME_DELAY_MS if delay_ms is None else delay_ms
+        #palette index 0 is transparent, 1 white, 2 light-gray, then the distinct age shades
+        shades = age_palette(max_age)
+        colors = [(255, 255, 255), (255, 255, 255), (200, 200, 200)]
+        age_index = []
+        for shade in shades:
+            if shade not in colors[1:]:
+                colors.append(shade)
+            age_index.append(colors.index(shade, 1))
+        if len(colors) > 256:
+            raise ValueError(f'Too many age shades for a PNG palette: {len(colors)} colours (max 256)')
+        self.colors = colors
+        self.age_index = np.array(age_index, dtype=np.uint8)
+        self.file = open(filename, 'wb')
+        self.previous = None
+        self.frames = 0
+        self.sequence = 0
+
+    def _render_indices(self, grid, age_grid):
+        alive = np.asarray(grid, dtype=bool)
+        indices = self.age_index[np.minimum(np.asarray(age_grid), len(self.age_index) - 1)]
+        return _render_array(alive, indices[:, :, None], np.uint8(2), np.uint8(1))[:, :, 0]
+
+    def _write_header(self, height, width):
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self.file.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)))
+        #number of frames is unknown until close(), the acTL chunk is rewritten there
+        self.actl_offset = self.file.tell()
+        self.file.write(_png_chunk(b'acTL', struct.pack('>II', 0, 0)))
+        self.file.write(_png_chunk(b'PLTE', bytes(value for color in self.colors for value in color)))
+        self.file.write(_png_chunk(b'tRNS', b'\x00'))
+
+    def _write_frame(self, pixels, top, left, blend_op):
+        height, width = pixels.shape
+        self.file.write(_png_chunk(b'fcTL', struct.pack('>IIIIIHHBB', self.sequence, width, height, left, top,
+                                                        self.delay_ms, 1000, 0, blend_op)))
+        self.sequence += 1
+        #every scanline starts with the filter type byte (0 - no filter)
+        scanlines = np.zeros((height, width + 1), dtype=np.uint8)
+        scanlines[:, 1:] = pixels
+        data = zlib.compress(scanlines.tobytes())
+        if self.frames == 0:
+            self.file.write(_png_chunk(b'IDAT', data))
+        else:
+            self.file.write(_png_chunk(b'fdAT', struct.pack('>I', self.sequence) + data))
+            self.sequence += 1
+        self.frames += 1
+
+    def add_frame(self, grid, age_grid):
+        pixels = self._render_indices(grid, age_grid)
+        if self.previous is None:
+            self._write_header(*pixels.shape)
+            self._write_frame(pixels, 0, 0, 0)
+        else:
+            changed = pixels != self.previous
+            changed_rows = np.flatnonzero(changed.any(axis=1))
+            if len(changed_rows) == 0:
+                #nothing changed: a single transparent pixel keeps the frame timing
+                self._write_frame(np.zeros((1, 1), dtype=np.uint8), 0, 0, 1)
+            else:
+                changed_cols = np.flatnonzero(changed.any(axis=0))
+                top, bottom = changed_rows[0], changed_rows[-1] + 1
+                left, right = changed_cols[0], changed_cols[-1] + 1
+                delta = pixels[top:bottom, left:right].copy()
+                delta[~changed[top:bottom, left:right]] = 0
+                #blend_op 1 (over): transparent pixels keep the previous frame
+                self._write_frame(delta, int(top), int(left), 1)
+        self.previous = pixels
+
+    def close(self):
+        if self.previous is not None:
+            self.file.write(_png_chunk(b'IEND', b''))
+            self.file.seek(self.actl_offset)
+            self.file.write(_png_chunk(b'acTL', struct.pack('>II', self.frames, 0)))
+        self.file.close()
+
+
+
+class TilePyramid:
+    '''
+    Writes every generation as a zoomable pyramid of PNG tiles instead of one huge image:
+    folder/generation_NN/<zoom>/<x>_<y>.png, tile_size x tile_size pixels (smaller at the right
+    and bottom edges). The largest zoom is the full-size image of write_png, every lower zoom
+    halves it (2x2 pixel averages), zoom 0 is a single tile.
+    Tiles are rendered one at a time straight from the board, a zoomed-out tile from its four
+    children, so the memory used does not depend on the image size.
+    A tile whose cells (state and shade) did not change since the previous generation is not
+    rendered again, it is hard-linked (or copied) from the previous pyramid.
+
+    TESTS
+    >>> import tempfile
+    >>> grid, age = [[1,0,0],[1,1,0],[0,0,1]], [[1,0,0],[3,2,0],[0,0,1]]
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     pyramid = TilePyramid(folder, 3, 3, tile_size=16)
+    ...     pyramid.write(grid, age, 0)
+    ...     pyramid.write(grid, age, 1)
+    ...     full = Image.new('RGB', (68, 68))
+    ...     for x in range(5):
+    ...         for y in range(5):
+    ...             full.paste(Image.open(pyramid.tile_path(1, pyramid.max_zoom, x, y)), (16 * x, 16 * y))
+    ...     top = Image.open(pyramid.tile_path(1, 0, 0, 0))
+    ...     reused = os.path.samefile(pyramid.tile_path(0, 0, 0, 0), pyramid.tile_path(1, 0, 0, 0))
+    >>> pyramid.max_zoom, full.tobytes() == render_frame(grid, age).tobytes(), top.size, reused
+    (3, True, (9, 9), True)
+    '''
+    def __init__(self, folder, rows, cols, max_age=None, tile_size=TILE_SIZE):
+        if np is None:
+            raise ImportError('numpy is required for the tile pyramid')
+        self.folder = folder
+        self.tile_size = tile_size
+        palette = age_palette(max_age)
+        self.max_age = len(palette) - 1
+        #pixel values: 0 - background, 1 - grid line, 2 + age - live cell
+        self.colors = np.array([(255, 255, 255), (200, 200, 200)] + palette, dtype=np.uint8)
+        self.x_cell = _cell_index(cols, CELL_SIZE, BORDER_WIDTH)
+        self.y_cell = _cell_index(rows, CELL_SIZE, BORDER_WIDTH)
+        self.x_line = _line_mask(cols, CELL_SIZE, BORDER_WIDTH)
+        self.y_line = _line_mask(rows, CELL_SIZE, BORDER_WIDTH)
+        #image size of every zoom, the last one is the full size
+        sizes = [(len(self.x_cell), len(self.y_cell))]
+        while max(sizes[0]) > tile_size:
+            width, height = sizes[0]
+            sizes.insert(0, ((width + 1) // 2, (height + 1) // 2))
+        self.sizes = sizes
+        self.max_zoom = len(sizes) - 1
+        self.col_ranges = self._cell_ranges(self.x_cell)
+        self.row_ranges = self._cell_ranges(self.y_cell)
+        self.prev_keys = None
+        self.prev_generation = None
+
+    def _cell_ranges(self, cell_index):
+        #range of the cells [first, last + 1) covered by every full-size tile along one axis
+        first, stop = [], []
+        for start in range(0, len(cell_index), self.tile_size):
+            cells = cell_index[start:start + self.tile_size]
+            cells = cells[cells >= 0]
+            first.append(int(cells[0]) if len(cells) else 0)
+            stop.append(int(cells[-1]) + 1 if len(cells) else 0)
+        return np.array(first), np.array(stop)
+
+    def generation_folder(self, generation):
+        return os.path.join(self.folder, f'generation_{generation:02d}')
+
+    def tile_path(self, generation, zoom, x, y):
+        return os.path.join(self.generation_folder(generation), str(zoom), f'{x}_{y}.png')
+
+    def _tile_counts(self, zoom):
+        width, height = self.sizes[zoom]
+        return -(-width // self.tile_size), -(-height // self.tile_size)
+
+    def _dirty_tiles(self, keys):
+        #dirty[zoom][y, x] is True for the tiles that must be rendered again
+        columns, rows = self._tile_counts(self.max_zoom)
+        if self.prev_keys is None:
+            dirty = np.ones((rows, columns), dtype=bool)
+        else:
+            changed = keys != self.prev_keys
+            dirty = np.empty((rows, columns), dtype=bool)
+            col_first, col_stop = self.col_ranges
+            for tile_row, (first, stop) in enumerate(zip(*self.row_ranges)):
+                changed_cols = np.concatenate(([0], np.cumsum(changed[first:stop].any(axis=0))))
+                dirty[tile_row] = changed_cols[col_stop] > changed_cols[col_first]
+        levels = [dirty]
+        for zoom in range(self.max_zoom - 1, -1, -1):
+            child = levels[0]
+            child = np.pad(child, ((0, child.shape[0] % 2), (0, child.shape[1] % 2)))
+            levels.insert(0, child.reshape(child.shape[0] // 2, 2, child.shape[1] // 2, 2).any(axis=(1, 3)))
+        return levels
+
+    def _render_tile(self, keys, x, y):
+        x0, y0 = x * self.tile_size, y * self.tile_size
+        x_cell = self.x_cell[x0:x0 + self.tile_size]
+        y_cell = self.y_cell[y0:y0 + self.tile_size]
+        index = (self.y_line[y0:y0 + self.tile_size, None] | self.x_line[None, x0:x0 + self.tile_size]).astype(np.intp)
+        #cells of the tile only, then stretched to pixels row-wise and column-wise
+        row_first, row_stop = self.row_ranges[0][y], self.row_ranges[1][y]
+        col_first, col_stop = self.col_ranges[0][x], self.col_ranges[1][x]
+        if row_first == row_stop or col_first == col_stop: #no cells, only grid lines
+            return self.colors[index]
+        cells = keys[row_first:row_stop, col_first:col_stop]
+        cells = cells.take(np.maximum(y_cell - row_first, 0), axis=0).take(np.maximum(x_cell - col_first, 0), axis=1)
+        live = (cells > 0) & (y_cell >= 0)[:, None] & (x_cell >= 0)[None, :] #live cells cover the grid lines
+        np.copyto(index, cells, where=live)
+        return self.colors[index]
+
+    def _zoom_out(self, children, x, y, zoom):
+        #children[dy][dx] are the pixels of the child tiles (None outside the image)
+        width, height = self.sizes[zoom + 1]
+        x0, y0 = 2 * x * self.tile_size, 2 * y * self.tile_size
+        combined = np.empty((min(height - y0, 2 * self.tile_size), min(width - x0, 2 * self.tile_size), 3),
+                            dtype=np.uint16)
+        for dy in range(2):
+            for dx in range(2):
+                if children[dy][dx] is not None:
+                    tile = children[dy][dx]
+                    top, left = dy * self.tile_size, dx * self.tile_size
+                    combined[top:top + tile.shape[0], left:left + tile.shape[1]] = tile
+        if combined.shape[0] % 2 or combined.shape[1] % 2: #image edge, repeat the last pixel row/column
+            combined = np.pad(combined, ((0, combined.shape[0] % 2), (0, combined.shape[1] % 2), (0, 0)), mode='edge')
+        total = combined[0::2, 0::2] + combined[1::2, 0::2]
+        total += combined[0::2, 1::2]
+        total += combined[1::2, 1::2]
+        total += 2 #rounding
+        total //= 4
+        return total.astype(np.uint8)
+
+    def _write_tile(self, keys, dirty, generation, zoom, x, y):
+        '''
+        Writes the tile and the tiles below it, returns its pixels (None if it was reused).
+        '''
+        path = self.tile_path(generation, zoom, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        columns, rows = self._tile_counts(zoom + 1) if zoom < self.max_zoom else (0, 0)
+        if not dirty[zoom][y, x]:
+            _link_or_copy(self.tile_path(self.prev_generation, zoom, x, y), path)
+            for child_x in range(2 * x, min(2 * x + 2, columns)):
+                for child_y in range(2 * y, min(2 * y + 2, rows)):
+                    self._write_tile(keys, dirty, generation, zoom + 1, child_x, child_y)
+            return None
+        if zoom == self.max_zoom:
+            pixels = self._render_tile(keys, x, y)
+        else:
+            children = [[None, None], [None, None]]
+            for dy in range(2):
+                for dx in range(2):
+                    child_x, child_y = 2 * x + dx, 2 * y + dy
+                    if child_x < columns and child_y < rows:
+                        child = self._write_tile(keys, dirty, generation, zoom + 1, child_x, child_y)
+                        if child is None: #reused, read it back
+                            with Image.open(self.tile_path(generation, zoom + 1, child_x, child_y)) as image:
+                                child = np.asarray(image.convert('RGB'))
+                        children[dy][dx] = child
+            pixels = self._zoom_out(children, x, y, zoom)
+        Image.fromarray(pixels, 'RGB').save(path)
+        return pixels
+
+    def write(self, grid, age_grid, generation):
+        '''
+        Writes the pyramid of the generation; generations must be written in order.
+        '''
+        alive = np.asarray(grid, dtype=bool)
+        keys = np.where(alive, np.minimum(np.asarray(age_grid), self.max_age) + 2, 0)
+        self._write_tile(keys, self._dirty_tiles(keys), generation, 0, 0, 0)
+        self.prev_keys = keys
+        self.prev_generation = generation
+
+
+def _file_crc32(filename, chunk_bytes=1 << 20):
+    crc = 0
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _link_or_copy(source, target):
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError: #no hard links on this file system
+        shutil.copyfile(source, target)
+
+
+SNAPSHOT_MAGIC = b'GOLS'
+SNAPSHOT_INDEX_MAGIC = b'GIDX'
+SNAPSHOT_HEADER = struct.Struct('<4sHII') #magic, version, rows, cols
+SNAPSHOT_RECORD = struct.Struct('<IBI') #generation, encoding (0 - raw, 1 - RLE), payload length
+SNAPSHOT_FOOTER = struct.Struct('<QI4s') #index offset, number of records, index magic
+
+def _rle_encode(data):
+    '''
+    Byte run-length encoding: (count, value) pairs, count is 1..255.
+
+    TESTS
+    >>> _rle_decode(_rle_encode(bytes(600) + b'ab'), 602) == bytes(600) + b'ab'
+    True
+    '''
+    encoded = bytearray()
+    idx, size = 0, len(data)
+    while idx < size:
+        value = data[idx]
+        end = idx + 1
+        while end < size and end - idx < 255 and data[end] == value:
+            end += 1
+        encoded += bytes((end - idx, value))
+        idx = end
+    return bytes(encoded)
+
+
+def _rle_decode(data, size):
+    decoded = bytearray()
+    for idx in range(0, len(data), 2):
+        decoded += bytes((data[idx + 1],)) * data[idx]
+    if len(decoded) != size:
+        raise ValueError(f'Corrupted RLE record: expected {size} bytes, got {len(decoded)}')
+    return bytes(decoded)
+
+
+class SnapshotWriter:
+    '''
+    Writes generations into a binary snapshot file:
+      header: magic 'GOLS', version, rows, cols;
+      one record per generation: generation, encoding, payload length, payload;
+      index: offsets of all records, then footer (index offset, count, magic 'GIDX').
+    The payload holds the bit-packed rows (pack_row, ceil(cols/8) bytes per row, little-endian),
+    optionally run-length encoded if rle is True and this makes the record smaller.
+    Every record is written with one call; the index is written by close().
+
+    TESTS
+    >>> import os
+    >>> test_file = 'test_snapshot.gol'
+    >>> try:
+    ...     with SnapshotWriter(test_file, 2, 3, rle=True) as snapshot:
+    ...         snapshot.write([[1,0,1],[0,1,1]], 0)
+    ...         snapshot.write([[0,0,0],[0,0,0]], 1)
+    ...     with SnapshotReader(test_file) as snapshot:
+    ...         snapshot.generations(), snapshot.read(0), snapshot.read(1)
+    ... finally:
+    ...     if os.path.exists(test_file):
+    ...         os.remove(test_file)
+    ([0, 1], [[1, 0, 1], [0, 1, 1]], [[0, 0, 0], [0, 0, 0]])
+    '''
+    def __init__(self, filename, rows, cols, rle=False):
+        self.rows, self.cols, self.rle = rows, cols, rle
+        self.row_bytes = (cols + 7) // 8
+        self.offsets = []
+        self.file = open(filename, 'wb')
+        self.file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, 1, rows, cols))
+
+    def write(self, grid, generation):
+        if len(grid) != self.rows or len(grid[0]) != self.cols:
+            raise ValueError(f'Grid size {len(grid)}x{len(grid[0])} does not match the snapshot size {self.rows}x{self.cols}')
+        payload = b''.join(pack_row(row).to_bytes(self.row_bytes, 'little') for row in grid)
+        encoding = 0
+        if self.rle:
+            encoded = _rle_encode(payload)
+            if len(encoded) < len(payload):
+                payload, encoding = encoded, 1
+        self.offsets.append(self.file.tell())
+        self.file.write(SNAPSHOT_RECORD.pack(generation, encoding, len(payload)) + payload)
+
+    def close(self):
+        index_offset = self.file.tell()
+        self.file.write(struct.pack(f'<{len(self.offsets)}Q', *self.offsets))
+        self.file.write(SNAPSHOT_FOOTER.pack(index_offset, len(self.offsets), SNAPSHOT_INDEX_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class SnapshotReader:
+    '''
+    Reads a snapshot file written by SnapshotWriter through mmap: only the index
+    (or, for a file without index, the record headers) is read on open, read(generation)
+    decodes just the requested record. The file is unmapped if it cannot be opened as a snapshot.
+
+    TESTS
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     filename = os.path.join(folder, 'bad.gol')
+    ...     with open(filename, 'wb') as f:
+    ...         _ = f.write(b'not a snapshot file')
+    ...     try:
+    ...         SnapshotReader(filename)
+    ...     except ValueError as err:
+    ...         print(os.path.basename(str(err)))
+    bad.gol is not a snapshot file
+    '''
+    def __init__(self, filename):
+        with open(filename, 'rb') as snapshot_file:
+            self.data = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self.data) < SNAPSHOT_HEADER.size:
+                raise ValueError(f'The file {filename} is not a snapshot file')
+            magic, version, self.rows, self.cols = SNAPSHOT_HEADER.unpack_from(self.data, 0)
+            if magic != SNAPSHOT_MAGIC or version != 1:
+                raise ValueError(f'The file {filename} is not a snapshot file')
+            self.row_bytes = (self.cols + 7) // 8
+            self.offsets = {} #generation -> record offset
+            for offset in self._record_offsets():
+                generation = SNAPSHOT_RECORD.unpack_from(self.data, offset)[0]
+                self.offsets[generation] = offset
+        except BaseException:
+            self.data.close()
+            raise
+
+    def _record_offsets(self):
+        size = len(self.data)
+        if size >= SNAPSHOT_HEADER.size + SNAPSHOT_FOOTER.size:
+            index_offset, count, magic = SNAPSHOT_FOOTER.unpack_from(self.data, size - SNAPSHOT_FOOTER.size)
+            if magic == SNAPSHOT_INDEX_MAGIC:
+                return struct.unpack_from(f'<{count}Q', self.data, index_offset)
+        #no index (the writer was not closed): walk the record headers
+        offsets = []
+        offset = SNAPSHOT_HEADER.size
+        while offset + SNAPSHOT_RECORD.size <= size:
+            length = SNAPSHOT_RECORD.unpack_from(self.data, offset)[2]
+            if offset + SNAPSHOT_RECORD.size + length > size:
+                break #truncated last record
+            offsets.append(offset)
+            offset += SNAPSHOT_RECORD.size + length
+        return offsets
+
+    def generations(self):
+        return sorted(self.offsets)
+
+    def read(self, generation):
+        if generation not in self.offsets:
+            raise KeyError(f'Generation {generation} is not in the snapshot')
+        offset = self.offsets[generation]
+        _, encoding, length = SNAPSHOT_RECORD.unpack_from(self.data, offset)
+        start = offset + SNAPSHOT_RECORD.size
+        payload = self.data[start:start + length]
+        if encoding == 1:
+            payload = _rle_decode(payload, self.rows * self.row_bytes)
+        row_bytes = self.row_bytes
+        return [unpack_row(int.from_bytes(payload[idx:idx + row_bytes], 'little'), self.cols)
+                for idx in range(0, self.rows * row_bytes, row_bytes)]
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def csv_to_snapshot(csv_filenames, snapshot_filename, first_generation=0, rle=True):
+    '''
+    @requires: csv_filenames is a list of CSV-files in the read_input format (same board size),
+      stored as generations first_generation, first_generation + 1, ...
+    @modifies: writes snapshot_filename to file system
+    @effects: converts the CSV-files into one snapshot file
+    @raises: FileNotFoundError, ValueError as read_input; ValueError if board sizes differ
+    @returns: None
+    '''
+    writer = None
+    try:
+        for idx, csv_filename in enumerate(csv_filenames):
+            grid = read_input(csv_filename)
+            if writer is None:
+                writer = SnapshotWriter(snapshot_filename, len(grid), len(grid[0]), rle)
+            writer.write(grid, first_generation + idx)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def snapshot_to_csv(snapshot_filename, generation, csv_filename):
+    '''
+    @requires: snapshot_filename is a snapshot file containing generation
+    @modifies: writes csv_filename to file system
+    @effects: saves the board of the generation in the CSV format of write_output (readable by read_input)
+    @raises: ValueError if the file is not a snapshot, KeyError if the generation is missing
+    @returns: None
+
+    TESTS
+    >>> import os
+    >>> try:
+    ...     write_output([[0,1],[1,1]], 'test_gen.csv')
+    ...     csv_to_snapshot(['test_gen.csv'], 'test_gen.gol', first_generation=7)
+    ...     snapshot_to_csv('test_gen.gol', 7, 'test_back.csv')
+    ...     read_input('test_back.csv')
+    ... finally:
+    ...     for test_file in ('test_gen.csv', 'test_gen.gol', 'test_back.csv'):
+    ...         if os.path.exists(test_file):
+    ...             os.remove(test_file)
+    [[0, 1], [1, 1]]
+    '''
+    with SnapshotReader(snapshot_filename) as snapshot:
+        write_output(snapshot.read(generation), csv_filename)
+
+
+class OutputWriter:
+    '''
+    Background output pipeline: write jobs (function + arguments) are put into a bounded queue
+    and executed by a pool of threads, so CSV/PNG encoding overlaps with the simulation.
+    submit() blocks while the queue is full, which bounds the memory used by pending snapshots.
+    The arguments must not be modified after submit() (run_application hands off grids
+    that are never modified again).
+    Errors raised by the jobs are collected: submit() and close() re-raise the first one.
+
+    TESTS
+    >>> results = []
+    >>> with OutputWriter(threads=2, queue_size=1) as writer:
+    ...     for idx in range(5):
+    ...         writer.submit(results.append, idx)
+    >>> sorted(results)
+    [0, 1, 2, 3, 4]
+    >>> writer = OutputWriter()
+    >>> writer.submit(write_output, [[1]], os.path.join('no_such_dir', 'x.csv'))
+    >>> try:
+    ...     writer.close()
+    ... except OSError as err: #the message holds the platform-specific path
+    ...     type(err).__name__, os.path.basename(err.filename)
+    ('FileNotFoundError', 'x.csv')
+    '''
+    def __init__(self, threads=WRITER_THREADS, queue_size=WRITER_QUEUE_SIZE):
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.errors = []
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None: #stop signal
+                    return
+                func, args = job
+                func(*args)
+            except Exception as e:
+                self.errors.append(e)
+            finally:
+                self.jobs.task_done()
+
+    def submit(self, func, *args):
+        if self.errors:
+            raise self.errors[0]
+        self.jobs.put((func, args))
+
+    def flush(self):
+        '''
+        Waits until all submitted jobs are done, the threads keep running.
+        '''
+        self.jobs.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def close(self):
+        '''
+        Waits until all submitted jobs are done and stops the threads.
+        '''
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.errors:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            #do not hide the original exception behind a write error
+            try:
+                self.close()
+            except Exception:
+                pass
+        return False
+
+class Instrumentation:
+    '''
+    Instrumentation of the run loop. Every stage of a generation ('step', 'age', 'write_output',
+    'write_png', ...) is wrapped in stage() (or job() for the functions run by OutputWriter);
+    the before hooks get {'generation', 'stage'}, the after hooks get the same event with
+    'seconds' and, for the stages given an output, 'bytes': the size of the written file or folder,
+    or the bytes appended to an open stream. end_generation() emits a 'generation' event with 'population'.
+    With metrics_file, all events are appended to it as JSON lines. A run resumed from the checkpoint
+    of generation resume_generation keeps the events of the generations up to it and appends the rest,
+    so the file covers the whole run (the events the interrupted run wrote after the checkpoint are dropped).
+    The hooks of job() run on the writer threads of OutputWriter, concurrently with the main loop:
+    they must be thread-safe (the metrics file is written under a lock).
+    With profile_generations = (first, last), these generations of the main loop run under
+    cProfile and tracemalloc (peak and top allocations in a 'profile' event). cProfile only sees
+    the thread that enables it, so the jobs submitted in these generations get their own profiler
+    in the writer thread; all of them are merged into profile_file by close(), after the writers finished.
+    Without hooks stage() returns a shared empty context and job() the function itself,
+    so a disabled instrumentation costs almost nothing.
+
+    TESTS
+    >>> events = []
+    >>> instrumentation = Instrumentation()
+    >>> instrumentation.add_hooks(after=events.append)
+    >>> with instrumentation.stage('step', 1):
+    ...     pass
+    >>> instrumentation.job('sum', 1, sum)([1, 2])
+    3
+    >>> import io
+    >>> stream = io.BytesIO(b'abc')
+    >>> _ = stream.seek(0, io.SEEK_END)
+    >>> instrumentation.job('append', 1, stream.write, output=stream)(b'de')
+    2
+    >>> events[-1]['bytes']
+    2
+    >>> instrumentation.end_generation(1, [[1, 0], [1, 1]])
+    >>> [(event['stage'], event['generation']) for event in events], events[-1]['population']
+    ([('step', 1), ('sum', 1), ('append', 1), ('generation', 1)], 3)
+    >>> Instrumentation().job('sum', 1, sum) is sum
+    True
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     metrics_file = os.path.join(folder, 'metrics.jsonl')
+    ...     for first, last, resume_generation in ((1, 5, None), (5, 7, 3)):
+    ...         instrumentation = Instrumentation(metrics_file, resume_generation=resume_generation)
+    ...         for gen in range(first, last + 1):
+    ...             instrumentation.end_generation(gen, [[1]])
+    ...         instrumentation.close()
+    ...     with open(metrics_file) as f:
+    ...         [json.loads(line)['generation'] for line in f]
+    [1, 2, 3, 5, 6, 7]
+    '''
+    def __init__(self, metrics_file=None, profile_generations=None, profile_file=PROFILE_FILE,
+                 resume_generation=None):
+        self.before_hooks = []
+        self.after_hooks = []
+        self.lock = threading.Lock() #jobs report from the writer threads
+        self.metrics = None
+        if metrics_file is not None:
+            kept = []
+            if resume_generation is not None and os.path.exists(metrics_file):
+                with open(metrics_file) as f:
+                    for line in f:
+                        try:
+                            if line.endswith('\n') and json.loads(line)['generation'] <= resume_generation:
+                                kept.append(line)
+                        except (ValueError, KeyError, TypeError):
+                            pass #malformed, e.g. the last line of an interrupted run
+            self.metrics = open(metrics_file, 'w')
+            self.metrics.writelines(kept)
+            self.after_hooks.append(self._write_metrics)
+        self.profile_generations = profile_generations
+        self.profile_file = profile_file
+        self.profiler = None
+        self.profiles = [] #finished profilers of the main loop and of the write jobs
+
+    def add_hooks(self, before=None, after=None):
+        if before is not None:
+            self.before_hooks.append(before)
+        if after is not None:
+            self.after_hooks.append(after)
+
+    def enabled(self):
+        return bool(self.before_hooks or self.after_hooks)
+
+    def _write_metrics(self, event):
+        with self.lock:
+            self.metrics.write(json.dumps(event) + '\n')
+
+    def _emit(self, hooks, event):
+        for hook in hooks:
+            hook(event)
+
+    def stage(self, name, generation, output=None):
+        '''
+        Returns a context manager timing the stage; output as in job().
+        '''
+        if not self.enabled():
+            return _NO_STAGE
+        return self._stage(name, generation, output)
+
+    @contextlib.contextmanager
+    def _stage(self, name, generation, output=None):
+        event = {'generation': generation, 'stage': name}
+        self._emit(self.before_hooks, dict(event))
+        stream = hasattr(output, 'tell')
+        size_before = output.tell() if stream else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            event['seconds'] = time.perf_counter() - start
+            size = _output_size(output)
+            if size is not None:
+                event['bytes'] = size - size_before
+            self._emit(self.after_hooks, event)
+
+    def job(self, name, generation, func, output=None):
+        '''
+        Returns func wrapped in a stage, to be submitted to OutputWriter; func itself when disabled.
+        output is the file or folder written by func, or the open file it appends to (then 'bytes'
+        counts only the appended bytes, so the jobs of one stream must run in order).
+        Inside the profiled generations, func runs under its own profiler.
+        '''
+        profile = self.profiler is not None
+        if not self.enabled() and not profile:
+            return func
+
+        def instrumented(*args):
+            with self._stage(name, generation, output):
+                if not profile:
+                    return func(*args)
+                profiler = cProfile.Profile()
+                try:
+                    return profiler.runcall(func, *args)
+                finally:
+                    with self.lock:
+                        self.profiles.append(profiler)
+        return instrumented
+
+    def start_generation(self, generation):
+        if self.profile_generations is not None and generation == self.profile_generations[0]:
+            tracemalloc.start()
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def end_generation(self, generation, grid):
+        if self.enabled():
+            self._emit(self.after_hooks, {'generation': generation, 'stage': 'generation',
+                                          'population': sum(map(sum, grid))})
+        if self.profiler is not None and generation == self.profile_generations[1]:
+            self._stop_profiling(generation)
+
+    def _stop_profiling(self, generation):
+        self.profiler.disable()
+        self.profiles.append(self.profiler)
+        self.profiler = None
+        top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self._emit(self.after_hooks, {'generation': generation, 'stage': 'profile',
+                                      'generations': list(self.profile_generations),
+                                      'profile_file': self.profile_file,
+                                      'peak_bytes': peak, 'top_allocations': [str(stat) for stat in top]})
+
+    def close(self):
+        '''
+        Stops the profiling and writes profile_file; call it after the writers are closed,
+        so the profiles of all the write jobs are included.
+        '''
+        if self.profiler is not None: #the run ended inside the profiled range
+            self._stop_profiling(None)
+        if self.profiles:
+            stats = pstats.Stats(self.profiles[0])
+            for profiler in self.profiles[1:]:
+                stats.add(profiler)
+            stats.dump_stats(self.profile_file)
+            self.profiles = []
+        if self.metrics is not None:
+            self.metrics.close()
+            self.metrics = None
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+def _output_size(output):
+    '''
+    Returns the position in an open file, the size of a file or the total size of the files in a folder,
+    None if output is None or does not exist.
+    '''
+    if output is None:
+        return None
+    if hasattr(output, 'tell'):
+        return output.tell()
+    if os.path.isdir(output):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(output) for name in names)
+    if os.path.exists(output):
+        return os.path.getsize(output)
+    return None
+
+
+class CycleDetector:
+    '''
+    Detects that the board returned to one of its last max_period states.
+    Every generation is added with add(); the hashes of the recent boards are kept in a rolling
+    window, a matching hash is confirmed by comparing the boards themselves.
+    After a cycle is found, grid_at(generation) returns the board of any later generation.
+
+    TESTS
+    >>> detector = CycleDetector(2)
+    >>> grid = [[0,0,0],[1,1,1],[0,0,0]]
+    >>> [detector.add(grid, 0), detector.add(model(grid), 1), detector.add(grid, 2)]
+    [None, None, 2]
+    >>> detector.first, detector.grid_at(7) == model(grid)
+    (0, True)
+    >>> CycleDetector(1).add([[1]], 0)
+    '''
+    def __init__(self, max_period=None):
+        self.max_period = CYCLE_MAX_PERIOD if max_period is None else max_period
+        self.recent = collections.deque(maxlen=self.max_period) #(generation, hash, grid)
+        self.first = None #first generation of the cycle
+        self.period = None
+        self.states = []
+
+    def add(self, grid, generation):
+        '''
+        Returns the period if grid repeats one of the last max_period boards, otherwise None.
+        '''
+        if self.max_period <= 0:
+            return None
+        key = hash(tuple(map(bytes, grid)))
+        for prev_generation, prev_key, prev_grid in self.recent:
+            if prev_key == key and prev_grid == grid:
+                self.first = prev_generation
+                self.period = generation - prev_generation
+                self.states = [state for gen, _, state in self.recent if gen >= prev_generation]
+                return self.period
+        self.recent.append((generation, key, grid))
+        return None
+
+    def grid_at(self, generation):
+        return self.states[(generation - self.first) % self.period]
+
+    def state(self):
+        '''
+        Returns the detector as a JSON-serializable dictionary (for checkpoints), see from_state.
+        '''
+        return {'max_period': self.max_period, 'first': self.first, 'period': self.period,
+                'recent': [[gen, _grid_to_rows(grid)] for gen, _, grid in self.recent],
+                'states': [_grid_to_rows(grid) for grid in self.states]}
+
+    @classmethod
+    def from_state(cls, state):
+        detector = cls(state['max_period'])
+        for gen, rows in state['recent']:
+            grid = _rows_to_grid(rows)
+            detector.recent.append((gen, hash(tuple(map(bytes, grid))), grid))
+        detector.first, detector.period = state['first'], state['period']
+        detector.states = [_rows_to_grid(rows) for rows in state['states']]
+        return detector
+
+    def summary(self, generation):
+        kind = 'still life' if self.period == 1 else f'cycle of period {self.period}'
+        return f'Generation {generation} repeats generation {self.first}: {kind}'
+
+
+def _grid_to_rows(grid):
+    return [''.join(map(str, row)) for row in grid]
+
+
+def _rows_to_grid(rows):
+    return [list(row.encode().translate(CELL_DIGITS)) for row in rows]
+
+
+CHECKPOINT_MAGIC = b'GOLC'
+CHECKPOINT_HEADER = struct.Struct('<4sHI') #magic, version, CRC32 of the payload
+
+def _checkpoint_path(output_dir, generation):
+    return os.path.join(output_dir, f'checkpoint_{generation:06d}.ckpt')
+
+
+def write_checkpoint(output_dir, state, keep=None):
+    '''
+    @requires: output_dir is an existing folder, state is a JSON-serializable dictionary
+      with the key 'generation' (see simulate)
+    @modifies: writes checkpoint_<generation>.ckpt to output_dir, deletes all but the keep latest checkpoints
+    @effects: the file is written under a temporary name, synced and renamed,
+      so a crash never leaves a partial checkpoint under the final name
+    @raises: OSError if cannot write the file
+    @returns: the name of the checkpoint file
+
+    TESTS
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     for gen in (5, 10, 15):
+    ...         _ = write_checkpoint(folder, {'generation': gen}, keep=2)
+    ...     with open(os.path.join(folder, 'checkpoint_000015.ckpt'), 'r+b') as f:
+    ...         _ = f.seek(-1, os.SEEK_END)
+    ...         _ = f.write(b'!') #damaged checkpoint
+    ...     sorted(os.listdir(folder)), read_latest_checkpoint(folder)
+    (['checkpoint_000010.ckpt', 'checkpoint_000015.ckpt'], {'generation': 10})
+    '''
+    keep = CHECKPOINT_KEEP if keep is None else keep
+    payload = zlib.compress(json.dumps(state).encode())
+    filename = _checkpoint_path(output_dir, state['generation'])
+    tmp_name = filename + '.tmp'
+    with open(tmp_name, 'wb') as f:
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, 1, zlib.crc32(payload)))
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_name, filename)
+    for old in _checkpoint_files(output_dir)[keep:]:
+        os.remove(old)
+    return filename
+
+
+def _checkpoint_files(output_dir):
+    '''
+    Returns the checkpoint files in output_dir, the latest generation first.
+
+    TESTS
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     for gen in (999998, 999999, 1000000):
+    ...         _ = write_checkpoint(folder, {'generation': gen}, keep=2)
+    ...     [os.path.basename(name) for name in _checkpoint_files(folder)]
+    ['checkpoint_1000000.ckpt', 'checkpoint_999999.ckpt']
+    '''
+    generations = {}
+    for name in glob.glob(os.path.join(glob.escape(output_dir), 'checkpoint_*.ckpt')):
+        number = os.path.basename(name)[len('checkpoint_'):-len('.ckpt')]
+        if number.isdigit():
+            generations[name] = int(number) #zero-padding stops working above 999999
+    return sorted(generations, key=generations.get, reverse=True)
+
+
+def read_checkpoint(filename):
+    '''
+    @requires: filename of a checkpoint written by write_checkpoint
+    @modifies: None
+    @effects: None
+    @raises: FileNotFoundError if the file does not exist,
+      ValueError if the file is not a checkpoint or it is damaged (wrong checksum)
+    @returns: the saved state
+    '''
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if len(data) < CHECKPOINT_HEADER.size:
+        raise ValueError(f'{filename} is not a checkpoint')
+    magic, version, crc = CHECKPOINT_HEADER.unpack_from(data)
+    if magic != CHECKPOINT_MAGIC or version != 1:
+        raise ValueError(f'{filename} is not a checkpoint')
+    payload = data[CHECKPOINT_HEADER.size:]
+    if zlib.crc32(payload) != crc:
+        raise ValueError(f'{filename} is damaged')
+    return json.loads(zlib.decompress(payload))
+
+
+def read_latest_checkpoint(output_dir):
+    '''
+    @requires: output_dir is a folder name
+    @modifies: None
+    @effects: damaged checkpoints are skipped
+    @raises: None
+    @returns: the state of the latest valid checkpoint in output_dir or None if there is none
+    '''
+    for filename in _checkpoint_files(output_dir):
+        try:
+            return read_checkpoint(filename)
+        except (OSError, ValueError, zlib.error):
+            continue
+    return None
+
+
+class ResultCache:
+    '''
+    Content-addressed on-disk cache of simulation results, shared by runs and processes:
+        folder/outputs/<key>: the output files of a finished run; the key is a hash of the seed board,
+          the engine, the rule, the number of generations and every setting that changes the files
+          (formats, CELL_SIZE, BORDER_WIDTH, BASE_COLOR, ...). The files are stored and materialised
+          by hard links (copies where links are not possible), so they must not be edited in place
+          (a later run writing the same output folder rewrites them: the entry is detected as changed and removed).
+        folder/states/<key>: the boards of generations 0..N in a snapshot file; the key does not
+          depend on the number of generations or the output, so any later run of the same seed
+          replays them instead of stepping the engine and continues from generation N.
+    Every entry is built in a temporary folder and renamed into place; its manifest.json lists
+    the files with their sizes, modification times and CRC32. A hit only compares the sizes and
+    modification times (an edit through a hard link changes them), with verify it also reads
+    every file to check its CRC32; a damaged entry is removed.
+    The modification time of the manifest is the last use of the entry; when the cache is larger
+    than max_bytes, the least recently used entries are removed.
+
+    TESTS
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     cache = ResultCache(os.path.join(folder, 'cache'))
+    ...     key = cache.output_key([[1, 0]], 'python', 'B3/S23', 5, ('csv',))
+    ...     with open(os.path.join(folder, 'a.csv'), 'w') as f:
+    ...         _ = f.write('1;0')
+    ...     cache.put_outputs(key, folder, ['a.csv'], {'generations': 5})
+    ...     os.makedirs(os.path.join(folder, 'out'))
+    ...     hit = cache.get_outputs(key, os.path.join(folder, 'out'))
+    ...     miss = cache.get_outputs(cache.output_key([[1, 1]], 'python', 'B3/S23', 5, ('csv',)), folder)
+    ...     hit, miss, os.listdir(os.path.join(folder, 'out'))
+    ...     stat = os.stat(os.path.join(folder, 'out', 'a.csv'))
+    ...     with open(os.path.join(folder, 'out', 'a.csv'), 'w') as f: #edited through the hard link
+    ...         _ = f.write('0;1')
+    ...     os.utime(os.path.join(folder, 'out', 'a.csv'), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    ...     ResultCache(cache.folder).get_outputs(key, folder) is not None #the same size and mtime
+    ...     ResultCache(cache.folder, verify=True).get_outputs(key, folder) is None #the CRC32 differs
+    ...     os.path.exists(os.path.join(cache.folder, 'outputs', key))
+    ({'generations': 5}, None, ['a.csv'])
+    True
+    True
+    False
+    '''
+    VERSION = 1 #part of every key, change it when the output of the same settings changes
+
+    def __init__(self, folder, max_bytes=None, verify=None):
+        self.folder = folder
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.verify = CACHE_VERIFY if verify is None else verify
+        for kind in ('outputs', 'states', 'tmp'):
+            os.makedirs(os.path.join(folder, kind), exist_ok=True)
+
+    @classmethod
+    def _key(cls, grid, settings):
+        digest = hashlib.sha256(json.dumps([cls.VERSION, len(grid), len(grid[0])] + settings).encode())
+        for row in grid:
+            digest.update(bytes(row))
+        return digest.hexdigest()
+
+    def state_key(self, grid, engine, rule):
+        return self._key(grid, ['states', engine, rule, CYCLE_MAX_PERIOD, ON_CYCLE])
+
+    def output_key(self, grid, engine, rule, generations, formats):
+        #GENERATIONS is the oldest age of the image palette (see age_palette), whatever the run length
+        return self._key(grid, ['outputs', engine, rule, generations, sorted(formats), CYCLE_MAX_PERIOD, ON_CYCLE,
+                                OUTPUT_FORMAT, DATA_FORMAT, SNAPSHOT_RLE, CELL_SIZE, BORDER_WIDTH, list(BASE_COLOR),
+                                GENERATIONS, FRAME_DELAY_MS, TILE_SIZE])
+
+    def temp_folder(self):
+        return tempfile.mkdtemp(dir=os.path.join(self.folder, 'tmp'))
+
+    def _read_manifest(self, entry):
+        try:
+            with open(os.path.join(entry, 'manifest.json')) as f:
+                manifest = json.load(f)
+            for name, (size, crc, mtime_ns) in manifest['files'].items():
+                stat = os.stat(os.path.join(entry, name))
+                if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                    raise ValueError(f'{name} was changed')
+                if self.verify and _file_crc32(os.path.join(entry, name)) != crc:
+                    raise ValueError(f'{name} was changed')
+        except (OSError, ValueError, KeyError, TypeError):
+            shutil.rmtree(entry, ignore_errors=True) #missing, incomplete or damaged
+            return None
+        os.utime(os.path.join(entry, 'manifest.json')) #last use, for the LRU eviction
+        return manifest
+
+    def _publish(self, kind, key, folder, files, info):
+        '''
+        Writes the manifest of the files in folder and renames folder to the entry (replacing an older one).
+        '''
+        manifest = dict(info, files={})
+        for name in files:
+            path = os.path.join(folder, name)
+            crc = _file_crc32(path)
+            stat = os.stat(path)
+            manifest['files'][name] = (stat.st_size, crc, stat.st_mtime_ns)
+        manifest['bytes'] = sum(size for size, _, _ in manifest['files'].values())
+        with open(os.path.join(folder, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        entry = os.path.join(self.folder, kind, key)
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.rename(folder, entry)
+        except OSError: #another process has just published the same entry
+            shutil.rmtree(folder, ignore_errors=True)
+        self.evict()
+
+    def get_outputs(self, key, output_dir):
+        '''
+        Links the cached output files into output_dir, returns the summary of the run or None on a miss.
+        '''
+        entry = os.path.join(self.folder, 'outputs', key)
+        manifest = self._read_manifest(entry) if os.path.isdir(entry) else None
+        if manifest is None:
+            return None
+        for name in manifest['files']:
+            target = os.path.join(output_dir, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _link_or_copy(os.path.join(entry, name), target)
+        return manifest['summary']
+
+    def put_outputs(self, key, output_dir, names, summary):
+        '''
+        Links (or copies) the files or folders names (relative to output_dir) into the cache
+        with the summary of the run.
+        '''
+        folder = self.temp_folder()
+        files = []
+        for name in names:
+            source = os.path.join(output_dir, name)
+            paths = [source] if os.path.isfile(source) else [os.path.join(root, file_name)
+                                                               for root, _, file_names in os.walk(source)
+                                                               for file_name in file_names]
+            for path in paths:
+                relative = os.path.relpath(path, output_dir)
+                os.makedirs(os.path.dirname(os.path.join(folder, relative)), exist_ok=True)
+                _link_or_copy(path, os.path.join(folder, relative))
+                files.append(relative)
+        self._publish('outputs', key, folder, files, {'summary': summary})
+
+    def get_states(self, key):
+        '''
+        Returns (snapshot file, last generation) of the cached boards or None.
+        '''
+        entry = os.path.join(self.folder, 'states', key)
+        manifest = self._read_manifest(entry) if os.path.isdir(entry) else None
+        if manifest is None:
+            return None
+        return os.path.join(entry, 'generations.gol'), manifest['generation']
+
+    def put_states(self, key, snapshot_file, generation):
+        '''
+        Moves snapshot_file (boards of generations 0..generation) into the cache.
+        '''
+        folder = os.path.dirname(snapshot_file)
+        os.replace(snapshot_file, os.path.join(folder, 'generations.gol'))
+        self._publish('states', key, folder, ['generations.gol'], {'generation': generation})
+
+    def evict(self):
+        entries = []
+        for kind in ('outputs', 'states'):
+            for key in os.listdir(os.path.join(self.folder, kind)):
+                manifest = os.path.join(self.folder, kind, key, 'manifest.json')
+                try:
+                    with open(manifest) as f:
+                        entries.append((os.path.getmtime(manifest), json.load(f)['bytes'], manifest))
+                except (OSError, ValueError, KeyError):
+                    continue #being published or removed by another process
+        total = sum(size for _, size, _ in entries)
+        for _, size, manifest in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.dirname(manifest), ignore_errors=True)
+            total -= size
+
+
+def _iter_cached_generations(snapshot_file, generations, engine, rule, detector, stage=None):
+    '''
+    Same as iter_generations, but the generations saved in snapshot_file (by ResultCache) are read
+    instead of computed; the engine continues from the last saved one if more generations are needed.
+    '''
+    with SnapshotReader(snapshot_file) as reader:
+        last = min(reader.generations()[-1], generations)
+        for gen in range(last + 1):
+            grid = reader.read(gen)
+            age_grid = init_age_grid(grid) if gen == 0 else update_age_grid(grid, age_grid)
+            if detector.period is None:
+                detector.add(grid, gen)
+            yield gen, grid, age_grid
+    if last < generations:
+        frames = iter_generations(grid, generations, engine, rule, age_grid, last, detector, stage=stage)
+        try:
+            next(frames) #the board of generation last, yielded already
+            yield from frames
+        finally:
+            frames.close()
+
+
+def iter_generations(grid, generations=None, engine=None, rule=None, age_grid=None, start=0,
+                     detector=None, on_cycle=None, stage=None):
+    '''
+    @requires: grid is a list of lists of 0/1, the board of generation start;
+      generations is the last generation or None (no limit); engine and rule as in make_engine;
+      age_grid is the age grid of the board (None - init_age_grid(grid));
+      detector is a CycleDetector holding the boards up to start (None - a new one);
+      on_cycle as ON_CYCLE (None - the constant);
+      stage is None or a function (name, generation) -> context manager, see Instrumentation.stage
+    @modifies: detector
+    @effects: lazy: a generation is computed only when the next item is requested, nothing is written.
+      When the board repeats one of its recent states, stops (on_cycle 'stop') or replays the cycle
+      without stepping the engine ('fast-forward'). The engine is closed when the generator
+      is exhausted or closed.
+    @raises: ValueError (on the first item) if the engine name or the rule is invalid
+    @returns: a generator of (generation, grid, age_grid), starting with the given board;
+      the yielded lists are never modified afterwards, they can be kept or handed to other threads
+
+    TESTS
+    >>> blinker = [[0,0,0],[1,1,1],[0,0,0]]
+    >>> frames = iter_generations(blinker)
+    >>> next(frames)[0], next(frames)[1]
+    (0, [[0, 1, 0], [0, 1, 0], [0, 1, 0]])
+    >>> import itertools
+    >>> [gen for gen, _, _ in itertools.islice(iter_generations(blinker), 0, 1000, 250)]
+    [0, 250, 500, 750]
+    >>> [gen for gen, _, _ in iter_generations(blinker, 10)][-1]
+    10
+    >>> detector = CycleDetector(2)
+    >>> detector.add(blinker, 0)
+    >>> [gen for gen, _, _ in iter_generations(blinker, 10, detector=detector, on_cycle='stop')]
+    [0, 1, 2]
+    >>> [age for _, _, age in iter_generations(blinker, 2)][-1]
+    [[0, 0, 0], [1, 3, 1], [0, 0, 0]]
+    '''
+    on_cycle = ON_CYCLE if on_cycle is None else on_cycle
+    stage = (lambda name, gen: _NO_STAGE) if stage is None else stage
+    if age_grid is None:
+        age_grid = init_age_grid(grid)
+        restored_ages = False
+    else:
+        restored_ages = True
+    if detector is None:
+        detector = CycleDetector()
+        detector.add(grid, start)
+    engine = make_engine(grid, engine, rule)
+    if restored_ages and hasattr(engine, 'set_age_grid'):
+        engine.set_age_grid(age_grid)
+    try:
+        yield start, grid, age_grid
+        gen = start
+        while generations is None or gen < generations:
+            gen += 1
+            if detector.period is not None:
+                if on_cycle == 'stop':
+                    return
+                grid = detector.grid_at(gen) #fast-forward: the engine is not needed any more
+                with stage('age', gen):
+                    age_grid = update_age_grid(grid, age_grid)
+            else:
+                with stage('step', gen):
+                    engine.step()
+                    grid = engine.to_grid()
+                with stage('age', gen):
+                    if hasattr(engine, 'to_age_grid'): #the fused engine updates the ages itself
+                        age_grid = engine.to_age_grid()
+                    else:
+                        age_grid = update_age_grid(grid, age_grid)
+                detector.add(grid, gen)
+            yield gen, grid, age_grid
+    finally:
+        if hasattr(engine, 'close'):
+            engine.close()
+
+
+def simulate(grid, output_dir, generations=None, formats=('csv', 'png'), engine=None, rule=None, verbose=True,
+             checkpoint_every=None, checkpoint_seconds=None, resume_from=None, cache=None):
+    '''
+    @requires: grid is a list of lists of 0/1, output_dir is an existing folder,
+      formats is a collection of 'csv' (grids: CSV-files or the snapshot, see DATA_FORMAT)
+      and 'png' (images: PNG-files or the animation, see OUTPUT_FORMAT), it can be empty;
+      engine and rule as in make_engine, None - ENGINE/RULE;
+      checkpoint_every/checkpoint_seconds as CHECKPOINT_EVERY/CHECKPOINT_SECONDS (None - the constants);
+      resume_from is None or a state returned by read_latest_checkpoint;
+      cache is a ResultCache or None (then CACHE_DIR is used if it is set); it is not used with resume_from
+    @modifies: creates output files in output_dir, adds the run to the cache
+    @effects: writes the generations (GENERATIONS if None) of the board produced by iter_generations,
+      see run_application.
+      Every checkpoint_every generations or checkpoint_seconds seconds writes a checkpoint
+      (grid, age grid, cycle detector, engine and rule) after all the earlier output files are written.
+      With resume_from, grid, engine and rule are ignored: the run continues after the saved generation
+      with the saved configuration and writes the same files as an uninterrupted run
+      (only per-generation files can be resumed, not the animation or the snapshot file).
+      With a cache, the outputs of an identical earlier run are linked into output_dir without simulating;
+      otherwise the cached boards of the same seed are replayed and only the later generations computed.
+    @raises: OSError when an output file cannot be written, ValueError for an unknown engine or invalid rule,
+      or when resuming into the animation or the snapshot file
+    @returns: {'generations': the last simulated generation, 'population': live cells in it,
+      'cycle_start', 'period': the repeated generation and the period if a cycle was found, else None}
+
+    TESTS
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     simulate([[0,0,0],[1,1,1],[0,0,0]], folder, 5, formats=(), verbose=False)
+    {'generations': 5, 'population': 3, 'cycle_start': None, 'period': None}
+    >>> seed = [[0,0,0,0],[0,1,1,0],[0,1,0,0],[0,0,0,0]]
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     _ = simulate(seed, folder, 3, formats=('csv',), verbose=False, checkpoint_every=2)
+    ...     state = read_latest_checkpoint(folder)
+    ...     simulate(None, folder, 6, formats=('csv',), verbose=False, resume_from=state)
+    ...     read_input(os.path.join(folder, 'generation_06.csv'))
+    {'generations': 6, 'population': 4, 'cycle_start': None, 'period': None}
+    [[0, 0, 0, 0], [0, 1, 1, 0], [0, 1, 1, 0], [0, 0, 0, 0]]
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     cache = ResultCache(os.path.join(folder, 'cache'))
+    ...     for generations in (3, 3, 8):
+    ...         os.makedirs(os.path.join(folder, f'run{generations}'), exist_ok=True)
+    ...         print(simulate([[0,0,0],[1,1,1],[0,0,0]], os.path.join(folder, f'run{generations}'),
+    ...                        generations, formats=('csv',), cache=cache))
+    {'generations': 3, 'population': 3, 'cycle_start': None, 'period': None}
+    {'generations': 3, 'population': 3, 'cycle_start': None, 'period': None}
+    {'generations': 8, 'population': 3, 'cycle_start': None, 'period': None}
+    '''
+    generations = GENERATIONS if generations is None else generations
+    checkpoint_every = CHECKPOINT_EVERY if checkpoint_every is None else checkpoint_every
+    checkpoint_seconds = CHECKPOINT_SECONDS if checkpoint_seconds is None else checkpoint_seconds
+    engine = ENGINE if engine is None else engine
+    rule = RULE if rule is None else rule
+    start_gen = 0
+    if resume_from is None:
+        age_grid = init_age_grid(grid)
+        detector = CycleDetector()
+        detector.add(grid, 0)
+    else:
+        if ('png' in formats and OUTPUT_FORMAT == 'apng') or ('csv' in formats and DATA_FORMAT == 'snapshot'):
+            raise ValueError('Only per-generation csv and png files can be resumed')
+        start_gen = resume_from['generation']
+        grid = _rows_to_grid(resume_from['grid'])
+        age_grid = resume_from['age_grid']
+        detector = CycleDetector.from_state(resume_from['detector'])
+        engine, rule = resume_from['engine'], resume_from['rule']
+    if resume_from is not None:
+        cache = None #the cache keys describe runs from generation 0, not the rest of a run
+    elif cache is None and CACHE_DIR is not None:
+        cache = ResultCache(CACHE_DIR)
+    state_file = None #boards of this run, for the cache
+    if cache is not None:
+        output_key = cache.output_key(grid, engine, rule, generations, formats)
+        summary = cache.get_outputs(output_key, output_dir)
+        if summary is not None:
+            if verbose and summary['period'] is not None:
+                detector.first, detector.period = summary['cycle_start'], summary['period']
+                print(detector.summary(detector.first + detector.period))
+            return summary
+        state_key = cache.state_key(grid, engine, rule)
+        cached_states = cache.get_states(state_key)
+        if cached_states is None or cached_states[1] < generations:
+            state_file = os.path.join(cache.temp_folder(), 'generations.gol.tmp')
+    produced = [] #output files and folders of this run, relative to output_dir
+    instrumentation = Instrumentation(None if METRICS_FILE is None else os.path.join(output_dir, METRICS_FILE),
+                                      PROFILE_GENERATIONS, os.path.join(output_dir, PROFILE_FILE),
+                                      None if resume_from is None else start_gen)
+    stage, job = instrumentation.stage, instrumentation.job
+    if cache is not None and cached_states is not None:
+        detector = CycleDetector()
+        frames = _iter_cached_generations(cached_states[0], generations, engine, rule, detector, stage)
+    else:
+        frames = iter_generations(grid, generations, engine, rule, age_grid, start_gen, detector, stage=stage)
+
+    #files are written in the background while the next generations are computed;
+    #leaving the with-block waits until everything is written (or raises the write error).
+    #Animation frames and snapshot records must be written in order, so they have their own single thread
+    try:
+        with OutputWriter() as writer, OutputWriter(threads=1) as frame_writer:
+            animation = None
+            if 'png' in formats and OUTPUT_FORMAT == 'apng':
+                animation = AnimationWriter(os.path.join(output_dir, ANIMATION_FILE))
+                produced.append(ANIMATION_FILE)
+            pyramid = None
+            if 'png' in formats and OUTPUT_FORMAT == 'tiles':
+                pyramid = TilePyramid(os.path.join(output_dir, TILES_DIR), len(grid), len(grid[0]))
+            snapshot = None
+            if 'csv' in formats and DATA_FORMAT == 'snapshot':
+                snapshot = SnapshotWriter(os.path.join(output_dir, SNAPSHOT_FILE), len(grid), len(grid[0]),
+                                          rle=SNAPSHOT_RLE)
+                produced.append(SNAPSHOT_FILE)
+            states = None
+            if state_file is not None:
+                states = SnapshotWriter(state_file, len(grid), len(grid[0]), rle=SNAPSHOT_RLE)
+
+            def save_image(grid, age_grid, gen):
+                if 'png' not in formats:
+                    return
+                if animation is not None:
+                    frame_writer.submit(job('write_frame', gen, animation.add_frame, animation.file), grid, age_grid)
+                elif pyramid is not None: #tiles are compared with the previous generation, so in order
+                    frame_writer.submit(job('write_tiles', gen, pyramid.write, pyramid.generation_folder(gen)),
+                                        grid, age_grid, gen)
+                    produced.append(os.path.relpath(pyramid.generation_folder(gen), output_dir))
+                else:
+                    png_path = os.path.join(output_dir, f"generation_{gen:02d}.png")
+                    writer.submit(job('write_png', gen, write_png_fast, png_path), grid, age_grid, png_path)
+                    produced.append(os.path.basename(png_path))
+
+            def save_checkpoint(gen):
+                writer.flush() #the checkpoint must not be newer than the files on disk
+                frame_writer.flush()
+                with stage('checkpoint', gen, _checkpoint_path(output_dir, gen)):
+                    write_checkpoint(output_dir, {'generation': gen, 'engine': engine, 'rule': rule,
+                                                  'grid': _grid_to_rows(grid), 'age_grid': age_grid,
+                                                  'detector': detector.state()})
+
+            cycle_reported = detector.period is not None
+            last_checkpoint = time.monotonic()
+            for gen, grid, age_grid in frames:
+                if states is not None:
+                    frame_writer.submit(job('write_states', gen, states.write, states.file), grid, gen)
+                if gen == start_gen:
+                    if gen == 0:
+                        #Save initial state in PNG-file
+                        save_image(grid, age_grid, 0)
+                    instrumentation.start_generation(gen + 1)
+                    continue
+                if detector.period is not None and not cycle_reported:
+                    cycle_reported = True
+                    summary = detector.summary(gen)
+                    if verbose:
+                        print(summary)
+                    writer.submit(write_summary, summary, os.path.join(output_dir, CYCLE_SUMMARY_FILE))
+                    produced.append(CYCLE_SUMMARY_FILE)
+                if snapshot is not None:
+                    frame_writer.submit(job('write_snapshot', gen, snapshot.write, snapshot.file), grid, gen)
+                elif 'csv' in formats:
+                    csv_path = os.path.join(output_dir, f"generation_{gen:02d}.csv")
+                    writer.submit(job('write_output', gen, write_output, csv_path), grid, csv_path)
+                    produced.append(os.path.basename(csv_path))
+                save_image(grid, age_grid, gen)
+                instrumentation.end_generation(gen, grid)
+                if ((checkpoint_every and gen % checkpoint_every == 0)
+                        or (checkpoint_seconds and time.monotonic() - last_checkpoint >= checkpoint_seconds)):
+                    save_checkpoint(gen)
+                    last_checkpoint = time.monotonic()
+                instrumentation.start_generation(gen + 1)
+
+            if animation is not None:
+                frame_writer.submit(animation.close)
+            if snapshot is not None:
+                frame_writer.submit(snapshot.close)
+            if states is not None:
+                frame_writer.submit(states.close)
+    finally:
+        frames.close()
+        instrumentation.close()
+    summary = {'generations': gen, 'population': sum(map(sum, grid)),
+               'cycle_start': detector.first, 'period': detector.period}
+    if cache is not None:
+        if state_file is not None:
+            cache.put_states(state_key, state_file, gen)
+        cache.put_outputs(output_key, output_dir, produced, summary)
+    return summary
+    
+
+
+def run_application():
+    '''
+    @requires: a valid CSV-file (or RLE/.cells pattern) placed in the same directory as the executable file (working directory)
+    @modifies: 
+        - creates or uses the existing folder 'output_files' in the working directory,
+        - creates output files (csv and png) for all generations and saves the result in the 'output_files' folder
+    @effects:
+        - asks user to enter the filename
+        - validates the file format and content
+        - simulates cell evolution
+        - saves each generation in csv (grid) and png (visualization includes ageing) files,
+          or all the images in one animated png if OUTPUT_FORMAT is 'apng'
+          or in a zoomable tile pyramid per generation if OUTPUT_FORMAT is 'tiles' (see TilePyramid)
+          and all the grids in one binary snapshot file if DATA_FORMAT is 'snapshot'.
+        - if CYCLE_MAX_PERIOD > 0 and the board repeats one of its last CYCLE_MAX_PERIOD states, writes the period
+          to CYCLE_SUMMARY_FILE and stops (ON_CYCLE is 'stop') or replays the cycle without
+          stepping the engine (ON_CYCLE is 'fast-forward').
+        - if METRICS_FILE is set, writes the time of every stage, the population and the bytes written
+          per generation as JSON lines; PROFILE_GENERATIONS runs a range of generations under cProfile/tracemalloc.
+        - writes checkpoints every CHECKPOINT_EVERY generations or CHECKPOINT_SECONDS seconds;
+          if RESUME is True and there is a valid checkpoint, continues from it instead of asking for a file.
+    @raises:
+        - FileNotFoundError — when file is not found by name;
+        - ValueError — when the file format is not valid;
+        - OSError — when an output file cannot be written.
+    @returns: None
+    '''
+    output_dir = 'output_files'
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = read_latest_checkpoint(output_dir) if RESUME else None
+    if checkpoint is not None:
+        print(f"Resuming from the checkpoint of generation {checkpoint['generation']}")
+        grid = None
+    while checkpoint is None:
+        upload_file = input('Enter filename for upload, e.g. \'myfile.csv \' (without quotes):').strip()
+        if not upload_file:
+            print('The filename cannot be empty. Please, try again')
+            continue
+        if not upload_file.lower().endswith(('.csv', '.rle', '.cells')):
+            print('Accepted only csv, rle or cells format. Please, try again')
+        try:
+            rule = pattern_rule(upload_file) #the seed runs under its own rule, if it declares one
+            grid = read_pattern(upload_file, rule)
+            break
+        
+        except FileNotFoundError as e:
+            print(f'{e}')
+        
+        except ValueError as e:
+            print(f'Error in the file: {e}')
+
+    simulate(grid, output_dir, rule=None if checkpoint is not None else rule, resume_from=checkpoint)
+    print('Simulation status: SUCCESS.\n Please, find the result in \'output_files\' folder (current directory)')
+
+
+def run_seed(seed_file, output_dir, generations=None, formats=('csv', 'png'), engine=None, rule=None,
+             checkpoint_every=None, resume=False, cache_dir=None):
+    '''
+    @requires: seed_file is a CSV-file or RLE/.cells pattern, cache_dir is None or the folder of a ResultCache,
+      rule is None (the rule declared by an RLE seed, see pattern_rule, otherwise RULE) or a rulestring
+      that the seed must not contradict; the other arguments as in simulate
+    @modifies: creates output_dir and the output files in it
+    @effects: simulates the seed without printing anything;
+      with resume, continues from the latest valid checkpoint in output_dir if there is one
+    @raises: None, errors of the seed are returned in the summary
+    @returns: the summary of simulate with 'seed', 'output_dir', 'seconds' and 'error'
+      (None or the message of the error)
+    '''
+    summary = {'seed': seed_file, 'output_dir': output_dir, 'generations': 0, 'population': None,
+               'cycle_start': None, 'period': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        checkpoint = read_latest_checkpoint(output_dir) if resume else None
+        if checkpoint is None:
+            rule = pattern_rule(seed_file) if rule is None else rule
+            grid = read_pattern(seed_file, rule)
+        else:
+            grid = None
+        os.makedirs(output_dir, exist_ok=True)
+        summary.update(simulate(grid, output_dir, generations, formats, engine, rule, verbose=False,
+                                checkpoint_every=checkpoint_every, resume_from=checkpoint,
+                                cache=None if cache_dir is None else ResultCache(cache_dir)))
+    except Exception as e: #one bad seed must not stop the batch
+        summary['error'] = f'{type(e).__name__}: {e}'
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def _run_seed_args(indexed_args):
+    index, args = indexed_args
+    return index, run_seed(*args)
+
+
+def seed_output_dirs(seed_files, output_dir):
+    '''
+    @requires: seed_files is a list of filenames
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: a separate folder in output_dir for every seed, named after the seed file
+      (with a suffix _2, _3, ... if the name is already taken), all the folders are different
+
+    TESTS
+    >>> [os.path.basename(folder) for folder in seed_output_dirs(['a/x.csv', 'b/x.rle', 'y.cells'], 'out')]
+    ['x', 'x_2', 'y']
+    >>> [os.path.basename(folder) for folder in seed_output_dirs(['a/x.csv', 'b/x.csv', 'x_2.csv', 'c/x.rle'], 'out')]
+    ['x', 'x_2', 'x_2_2', 'x_3']
+    '''
+    taken = set()
+    folders = []
+    for seed_file in seed_files:
+        name = os.path.splitext(os.path.basename(seed_file))[0]
+        folder, suffix = name, 1
+        while folder in taken:
+            suffix += 1
+            folder = f'{name}_{suffix}'
+        taken.add(folder)
+        folders.append(os.path.join(output_dir, folder))
+    return folders
+
+
+def run_batch(seed_files, output_dir='output_files', generations=None, formats=('csv', 'png'),
+              workers=None, engine=None, rule=None, log=None, checkpoint_every=None, resume=False, cache_dir=None):
+    '''
+    @requires: seed_files is a list of seed filenames, workers is a positive integer (None - WORKERS),
+      the other arguments as in simulate
+    @modifies: creates a folder in output_dir for every seed (see seed_output_dirs) with its output files
+    @effects: simulates the seeds concurrently in a pool of worker processes (in this process if workers is 1
+      or with the parallel engine, which starts its own processes: pool workers cannot have children);
+      log (if given) is called with the summary of every seed when it is finished
+    @raises: None, errors of a seed are returned in its summary
+    @returns: the summaries of run_seed in the order of seed_files
+    '''
+    workers = WORKERS if workers is None else workers
+    jobs = [(seed_file, folder, generations, tuple(formats), engine, rule, checkpoint_every, resume, cache_dir)
+            for seed_file, folder in zip(seed_files, seed_output_dirs(seed_files, output_dir))]
+    summaries = [None] * len(jobs)
+    if workers <= 1 or len(jobs) <= 1 or (ENGINE if engine is None else engine) == 'parallel':
+        finished = map(_run_seed_args, enumerate(jobs))
+        pool = None
+    else:
+        pool = multiprocessing.Pool(min(workers, len(jobs)))
+        finished = pool.imap_unordered(_run_seed_args, enumerate(jobs))
+    try:
+        for index, summary in finished:
+            summaries[index] = summary
+            if log is not None:
+                log(summary)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return summaries
+
+
+def format_summary(summary):
+    '''
+    @requires: summary as returned by run_seed
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: one line describing the result of the seed
+
+    TESTS
+    >>> format_summary({'seed': 'a.csv', 'generations': 4, 'population': 3, 'cycle_start': 2, 'period': 2,
+    ...                 'seconds': 0.5, 'error': None})
+    'a.csv: OK, 4 generations, population 3, cycle of period 2 from generation 2, 0.50 s'
+    >>> format_summary({'seed': 'b.csv', 'seconds': 0.0, 'error': 'ValueError: bad'})
+    'b.csv: FAILED, ValueError: bad'
+    '''
+    if summary['error'] is not None:
+        return f"{summary['seed']}: FAILED, {summary['error']}"
+    line = f"{summary['seed']}: OK, {summary['generations']} generations, population {summary['population']}"
+    if summary['period'] is not None:
+        kind = 'still life' if summary['period'] == 1 else f"cycle of period {summary['period']}"
+        line += f", {kind} from generation {summary['cycle_start']}"
+    return line + f", {summary['seconds']:.2f} s"
+
+
+def main(argv=None):
+    '''
+    Non-interactive entry point, e.g.
+        python Python_basics_practice5_GoL.py 'seeds/*.csv' glider.rle -g 100 -o results -f csv png -w 4
+    Every seed gets its own folder in the output folder; prints one summary line per seed.
+    Ensemble mode, e.g. 5000 seeded 64x64 soups for 500 generations:
+        python Python_basics_practice5_GoL.py --ensemble 5000 --size 64 64 --seed 1 -g 500 -o results
+    writes ENSEMBLE_FILE to the output folder and prints the summary.
+    @returns: exit code, 1 if any seed failed
+    '''
+    parser = argparse.ArgumentParser(description='Runs the Game of life for many seed files')
+    parser.add_argument('seeds', nargs='*', help='seed files (CSV, RLE or .cells) or glob patterns')
+    parser.add_argument('-g', '--generations', type=int, default=GENERATIONS)
+    parser.add_argument('-o', '--output-dir', default='output_files')
+    parser.add_argument('-f', '--formats', nargs='+', default=['csv', 'png'], choices=['csv', 'png', 'none'],
+                        help="output files of every generation, 'none' - only the summary")
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS)
+    parser.add_argument('-e', '--engine', default=ENGINE, choices=list(ENGINES))
+    parser.add_argument('-r', '--rule', default=None,
+                        help='B/S rulestring, e.g. B36/S23 (default: the rule of an RLE seed, otherwise RULE)')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY, help='generations between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='continue every seed from its latest checkpoint')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='folder of the result cache shared by the runs')
+    parser.add_argument('--ensemble', type=int, metavar='COUNT', help='simulate COUNT random soups instead of seeds')
+    parser.add_argument('--size', type=int, nargs=2, default=[50, 50], metavar=('ROWS', 'COLS'),
+                        help='board size of the ensemble')
+    parser.add_argument('--density', type=float, default=SOUP_DENSITY, help='live cell probability of the soups')
+    parser.add_argument('--seed', type=int, help='random seed of the soups')
+    args = parser.parse_args(argv)
+
+    if args.ensemble is not None:
+        results = run_ensemble(args.ensemble, args.size[0], args.size[1], args.generations,
+                               args.density, args.seed, args.rule)
+        os.makedirs(args.output_dir, exist_ok=True)
+        write_ensemble(results, os.path.join(args.output_dir, ENSEMBLE_FILE))
+        print(ensemble_summary(results))
+        return 0
+    if not args.seeds:
+        parser.error('give seed files or --ensemble')
+
+    seed_files = []
+    for pattern in args.seeds:
+        matches = sorted(glob.glob(pattern))
+        seed_files.extend(matches if matches else [pattern]) #a missing file is reported in its summary
+    formats = [] if 'none' in args.formats else args.formats
+    summaries = run_batch(seed_files, args.output_dir, args.generations, formats, args.workers,
+                          args.engine, args.rule, log=lambda summary: print(format_summary(summary)),
+                          checkpoint_every=args.checkpoint_every, resume=args.resume, cache_dir=args.cache_dir)
+    failed = sum(summary['error'] is not None for summary in summaries)
+    print(f'{len(summaries) - failed} of {len(summaries)} seeds simulated, results in {args.output_dir}')
+    return 1 if failed else 0
+
 
-    for gen in range(1, GENERATIONS + 1):
-        grid = model(grid)
-        age_grid = update_age_grid(grid, age_grid)
-        csv_path = os.path.join(output_dir, f"generation_{gen:02d}.csv")
-        png_path = os.path.join(output_dir, f"generation_{gen:02d}.png")
-        write_output(grid, csv_path)
-        write_png(grid, age_grid, png_path)
-    
-    print('Simulation status: SUCCESS.\n Please, find the result in \'output_files\' folder (current directory)')
-    
-    
-        
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
     
+    if len(sys.argv) > 1:
+        sys.exit(main())
     run_application()
 
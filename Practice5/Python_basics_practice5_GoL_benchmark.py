@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the Game of life simulation (Python_basics_practice5_GoL.py).
+
+Measures separately:
+    - step throughput (cells per second) of every engine,
+    - loading a seed file (read_input),
+    - CSV output (write_output),
+    - PNG encoding (write_png_fast, and write_png for small boards),
+and the peak memory (tracemalloc) of every benchmark.
+Boards are seeded random soups or known patterns placed in the middle of the board.
+
+Usage (from the Practice5 folder):
+    python Python_basics_practice5_GoL_benchmark.py --output bench.json
+    python Python_basics_practice5_GoL_benchmark.py --output new.json --baseline bench.json
+The second command exits with code 1 if a benchmark became slower than the baseline
+by more than --threshold.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import Python_basics_practice5_GoL as gol
+
+SIZES = [10, 100, 500, 1000, 2000, 4000]
+PATTERNS = ['soup', 'r-pentomino', 'acorn', 'glider-gun']
+SOUP_DENSITY = 0.35
+STEPS = 5 #generations per step benchmark
+REPEAT = 3 #every benchmark is repeated, the best time is reported
+THRESHOLD = 0.25 #allowed slow-down against the baseline (0.25 = 25%)
+MAX_PNG_PIXELS = 60000000 #larger frames are skipped (a 4000x4000 board is ~7.7e9 pixels)
+
+#largest board size per engine/function, the slow ones would take minutes on big boards
+MAX_SIZE = {'python': 500,
+            'sparse': 1000,
+            'write_png': 100,
+            }
+
+KNOWN_PATTERNS = {'r-pentomino': 'x = 3, y = 3\nb2o$2o$bo!',
+                  'acorn': 'x = 7, y = 3\nbo$3bo$2o2b3o!',
+                  'glider-gun': ('x = 36, y = 9\n24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$'
+                                 '2o8bo3bob2o4bobo$10bo5bo7bo$11bo3bo$12b2o!'),
+                  }
+
+def make_board(pattern, size, seed=0):
+    '''
+    @requires: pattern is 'soup' or a key of KNOWN_PATTERNS, size is a positive integer
+    @modifies: None
+    @effects: None
+    @raises: ValueError if the pattern does not fit into the board
+    @returns: a size x size grid (list of lists of 0/1): a seeded random soup
+      or the pattern placed in the middle of an empty board
+
+    TESTS
+    >>> make_board('soup', 3, seed=1) == make_board('soup', 3, seed=1)
+    True
+    >>> make_board('r-pentomino', 5)
+    [[0, 0, 0, 0, 0], [0, 0, 1, 1, 0], [0, 1, 1, 0, 0], [0, 0, 1, 0, 0], [0, 0, 0, 0, 0]]
+    '''
+    if pattern == 'soup':
+        rng = random.Random(seed)
+        return [[1 if rng.random() < SOUP_DENSITY else 0 for _ in range(size)] for _ in range(size)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rle_file = os.path.join(tmp_dir, 'pattern.rle')
+        with open(rle_file, 'w') as f:
+            f.write(KNOWN_PATTERNS[pattern])
+        shape = gol.read_rle(rle_file)
+    rows, cols = len(shape), len(shape[0])
+    if rows > size or cols > size:
+        raise ValueError(f'Pattern {pattern} ({cols}x{rows}) does not fit into {size}x{size}')
+    board = [[0] * size for _ in range(size)]
+    top, left = (size - rows) // 2, (size - cols) // 2
+    for row in range(rows):
+        board[top + row][left:left + cols] = shape[row]
+    return board
+
+
+def measure(func, repeat=REPEAT):
+    '''
+    @requires: func is a callable without arguments, repeat is a positive integer
+    @modifies: None
+    @effects: calls func repeat + 1 times
+    @raises: whatever func raises
+    @returns: (best time in seconds, peak traced memory in bytes of one extra call)
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def _allowed(name, size):
+    return size <= MAX_SIZE.get(name, size)
+
+
+def run_benchmarks(sizes=None, patterns=None, engines=None, repeat=REPEAT, seed=0, log=print):
+    '''
+    @requires: sizes is a list of board sizes, patterns a list of names (see make_board),
+      engines a list of keys of gol.ENGINES; None means all of them
+    @modifies: writes and deletes temporary files
+    @effects: runs the benchmarks, log is called with one line per result
+    @raises: None
+    @returns: a list of result dictionaries:
+      {'benchmark', 'engine', 'pattern', 'size', 'seconds', 'cells_per_second', 'peak_bytes'}
+    '''
+    sizes = SIZES if sizes is None else sizes
+    patterns = PATTERNS if patterns is None else patterns
+    engines = list(gol.ENGINES) if engines is None else engines
+    results = []
+
+    def record(benchmark, engine, pattern, size, seconds, peak, cells):
+        result = {'benchmark': benchmark, 'engine': engine, 'pattern': pattern, 'size': size,
+                  'seconds': seconds, 'cells_per_second': cells / seconds if seconds else None,
+                  'peak_bytes': peak}
+        results.append(result)
+        log(f'{benchmark:14s} {engine or "-":10s} {pattern:12s} {size:5d}  {seconds * 1000:10.2f} ms'
+            f'  {result["cells_per_second"] or 0:12.3g} cells/s  {peak / 1e6:9.2f} MB')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            for pattern in patterns:
+                try:
+                    board = make_board(pattern, size, seed)
+                except ValueError:
+                    continue #the pattern is larger than the board
+                cells = size * size
+
+                for name in engines:
+                    if not _allowed(name, size):
+                        continue
+                    engine = gol.make_engine(board, name) #set-up is not part of the step time
+                    def run_steps():
+                        for _ in range(STEPS):
+                            engine.step()
+                    seconds, peak = measure(run_steps, repeat)
+                    if hasattr(engine, 'close'):
+                        engine.close()
+                    record('step', name, pattern, size, seconds / STEPS, peak, cells)
+
+                if pattern != 'soup':
+                    continue #I/O cost depends on the board size, not on the pattern
+                csv_file = os.path.join(tmp_dir, 'board.csv')
+                seconds, peak = measure(lambda: gol.write_output(board, csv_file), repeat)
+                record('write_csv', None, pattern, size, seconds, peak, cells)
+                seconds, peak = measure(lambda: gol.read_input(csv_file), repeat)
+                record('load_csv', None, pattern, size, seconds, peak, cells)
+
+                age_grid = gol.init_age_grid(board)
+                pitch = gol.CELL_SIZE + gol.BORDER_WIDTH
+                if (size * pitch) ** 2 > MAX_PNG_PIXELS:
+                    continue
+                png_file = os.path.join(tmp_dir, 'board.png')
+                for name, func in (('write_png_fast', gol.write_png_fast), ('write_png', gol.write_png)):
+                    if _allowed(name, size):
+                        seconds, peak = measure(lambda: func(board, age_grid, png_file), repeat)
+                        record(name, None, pattern, size, seconds, peak, cells)
+    return results
+
+
+def save_results(results, filename):
+    '''
+    @requires: results as returned by run_benchmarks, filename of the output file
+    @modifies: writes filename (JSON) to file system
+    @effects: saves the results together with the Python/platform versions
+    @raises: IOError if cannot write the file
+    @returns: None
+    '''
+    data = {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results}
+    with open(filename, 'w') as f:
+        json.dump(data, f, indent=1)
+
+
+def compare_results(results, baseline_file, threshold=THRESHOLD):
+    '''
+    @requires: results as returned by run_benchmarks, baseline_file saved by save_results,
+      threshold is the allowed relative slow-down
+    @modifies: None
+    @effects: None
+    @raises: FileNotFoundError if the baseline does not exist
+    @returns: a list of (result, baseline seconds) for every benchmark that is slower
+      than baseline * (1 + threshold)
+
+    TESTS
+    >>> import os
+    >>> old = [{'benchmark': 'step', 'engine': 'numpy', 'pattern': 'soup', 'size': 10, 'seconds': 1.0}]
+    >>> new = [dict(old[0], seconds=1.5)]
+    >>> try:
+    ...     save_results(old, 'test_baseline.json')
+    ...     [baseline for _, baseline in compare_results(new, 'test_baseline.json', 0.25)]
+    ... finally:
+    ...     os.remove('test_baseline.json')
+    [1.0]
+    '''
+    with open(baseline_file) as f:
+        baseline = {_result_key(result): result for result in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        old = baseline.get(_result_key(result))
+        if old is not None and result['seconds'] > old['seconds'] * (1 + threshold):
+            regressions.append((result, old['seconds']))
+    return regressions
+
+
+def _result_key(result):
+    return (result['benchmark'], result['engine'], result['pattern'], result['size'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the Game of life engines, loader and renderer')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='board sizes (side length)')
+    parser.add_argument('--patterns', nargs='+', default=PATTERNS, choices=PATTERNS)
+    parser.add_argument('--engines', nargs='+', default=list(gol.ENGINES), choices=list(gol.ENGINES))
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file for the results')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.patterns, args.engines, args.repeat, args.seed)
+    save_results(results, args.output)
+    print(f'Results saved to {args.output}')
+    if args.baseline:
+        regressions = compare_results(results, args.baseline, args.threshold)
+        for result, old_seconds in regressions:
+            print(f'REGRESSION {result["benchmark"]} {result["engine"] or "-"} {result["pattern"]} {result["size"]}: '
+                  f'{old_seconds * 1000:.2f} ms -> {result["seconds"] * 1000:.2f} ms')
+        if regressions:
+            return 1
+        print('No regressions against ' + args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
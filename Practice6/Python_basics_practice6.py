@@ -4,10 +4,140 @@ Created on Sat Jan 24 23:50:18 2026
 
 @author: DOM1804
 """
+import os
+import gc
 import csv
 import math
+import heapq
+import bisect
+import marshal
+import hashlib
+from array import array
+try:
+    import numpy as np
+except ImportError: #numpy is optional, only the batch distances (ZipDistances) need it
+    np = None
 
 AVG_EARTH_RADIUS_MILES = 3959.0
+INDEX_SUFFIX = '.idx' #precompiled index, written next to the CSV-file
+INDEX_VERSION = 2 #change it when the layout of the index changes
+GRID_CELL_DEGREES = 0.1 #side of the latitude/longitude buckets of the spatial index
+NEAREST_START_MILES = 10.0 #first search radius of the k-nearest query, doubled until enough ZIP codes are found
+BORDER_MILES = 1e-9 #points this close to the search radius are decided by haversine_distance
+DISTANCE_CHUNK_ELEMENTS = 1 << 20 #distances computed at once by ZipDistances (~8 MB per temporary array)
+
+class ZipRecord:
+    '''
+    Lightweight view of one row of a ZipStore: record['latitude'], record['city'], ...
+    (or record.latitude, record.city, ...); dict(record) gives the old dictionary form.
+
+    TESTS
+    >>> store = ZipStore(['12180'], array('d', [42.7]), array('d', [-73.6]),
+    ...                  {'city': ['Troy'], 'state': ['NY'], 'county': ['Rensselaer']},
+    ...                  {field: array('I', [0]) for field in ZipStore.STRING_FIELDS})
+    >>> record = ZipRecord(store, 0)
+    >>> record.zipcode, record.city, record['latitude'], dict(record)['county']
+    ('12180', 'Troy', 42.7, 'Rensselaer')
+    >>> record['zip_code']
+    Traceback (most recent call last):
+    ...
+    KeyError: 'zip_code'
+    '''
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, field):
+        if field == 'latitude':
+            return self.store.latitudes[self.row]
+        if field == 'longitude':
+            return self.store.longitudes[self.row]
+        if field in self.store.codes:
+            return self.store.strings[field][self.store.codes[field][self.row]]
+        raise KeyError(field)
+
+    def keys(self):
+        return ZipStore.FIELDS
+
+    zipcode = property(lambda self: self.store.zips[self.row])
+    latitude = property(lambda self: self['latitude'])
+    longitude = property(lambda self: self['longitude'])
+    city = property(lambda self: self['city'])
+    state = property(lambda self: self['state'])
+    county = property(lambda self: self['county'])
+
+    def __repr__(self):
+        return f'ZipRecord({self.zipcode!r}, {dict(self)!r})'
+
+class ZipStore:
+    '''
+    Columnar store of the ZIP records:
+        zips - list of zipcodes, row_of - zipcode -> row,
+        latitudes, longitudes - array('d') columns,
+        city, state and county are dictionary-encoded: strings[field] is the list of distinct values,
+        codes[field] is an array('I') column with the position of every row's value in that list.
+    Works like the old {zipcode: {field: value}} dictionary for reading:
+    store.get(zipcode), store[zipcode], zipcode in store, len(store), iteration over the zipcodes;
+    the records are ZipRecord views created on demand.
+
+    TESTS
+    >>> store = ZipStore(['12180', '12181'], array('d', [42.7, 42.8]), array('d', [-73.6, -73.7]),
+    ...                  {'city': ['Troy'], 'state': ['NY'], 'county': ['Rensselaer']},
+    ...                  {field: array('I', [0, 0]) for field in ZipStore.STRING_FIELDS})
+    >>> len(store), '12181' in store, '99999' in store, list(store)
+    (2, True, False, ['12180', '12181'])
+    >>> store['12181']
+    ZipRecord('12181', {'latitude': 42.8, 'longitude': -73.7, 'city': 'Troy', 'state': 'NY', 'county': 'Rensselaer'})
+    >>> store.get('12180').longitude, store.get('99999')
+    (-73.6, None)
+    >>> dict(ZipStore.from_parts(store.to_parts())['12181']) == dict(store['12181'])
+    True
+    '''
+    FIELDS = ('latitude', 'longitude', 'city', 'state', 'county')
+    STRING_FIELDS = ('city', 'state', 'county')
+
+    def __init__(self, zips, latitudes, longitudes, strings, codes):
+        self.zips = zips
+        self.row_of = {zipcode: row for row, zipcode in enumerate(zips)}
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.strings = strings
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.zips)
+
+    def __contains__(self, zipcode):
+        return zipcode in self.row_of
+
+    def __iter__(self):
+        return iter(self.zips)
+
+    def __getitem__(self, zipcode):
+        return ZipRecord(self, self.row_of[zipcode])
+
+    def get(self, zipcode, default=None):
+        row = self.row_of.get(zipcode)
+        return default if row is None else ZipRecord(self, row)
+
+    def to_parts(self):
+        '''
+        Returns the columns as plain lists/bytes (for marshal), see from_parts.
+        '''
+        return (self.zips, self.latitudes.tobytes(), self.longitudes.tobytes(), self.strings,
+                {field: column.tobytes() for field, column in self.codes.items()})
+
+    @classmethod
+    def from_parts(cls, parts):
+        zips, latitudes, longitudes, strings, codes = parts
+        store = cls(zips, array('d', latitudes), array('d', longitudes), strings,
+                    {field: array('I', column) for field, column in codes.items()})
+        columns = [store.latitudes, store.longitudes] + [store.codes[field] for field in cls.STRING_FIELDS]
+        if any(len(column) != len(zips) for column in columns):
+            raise ValueError('The columns of the ZipStore have different lengths')
+        return store
 
 def read_csv_zipcodes(filename='zip_codes_states.csv'):
     '''
@@ -22,23 +152,44 @@ def read_csv_zipcodes(filename='zip_codes_states.csv'):
      @raises: FileNotFoundError if the file is not found in the mentioned directory,
        ValueError: if any errors arise during processing. 
 
-     @returns: a tuple of 2 dictionaries - 
-       1. a dictionary to search data by zipcode:
-           { 5-digit zipcode : { 'latitude' : float,
-                                 'longitude': float, 
-                                 'city' : str,
-                                 'state': str,
-                                 'county': str
-                                },
+     @returns: a tuple - 
+       1. a ZipStore to search data by zipcode (works like a dictionary):
+           { 5-digit zipcode : record with 'latitude' : float,
+                                           'longitude': float, 
+                                           'city' : str,
+                                           'state': str,
+                                           'county': str,
             ...}
+          (the values are stored in columns, the keys of by_city_state_dict use the same string objects)
 
        2. a dictionary to search data by a 'city-state' tuple:
            {
                (city, state) : [sorted list of indices],
                ...
             }
+
+     TESTS
+     >>> import tempfile
+     >>> with tempfile.TemporaryDirectory() as folder:
+     ...     csv_file = os.path.join(folder, 'zips.csv')
+     ...     with open(csv_file, 'w') as f:
+     ...         _ = f.write('"zip_code","latitude","longitude","city","state","county"\\n'
+     ...                     '"12180",42.7,-73.6,"Troy","NY","Rensselaer"\\n'
+     ...                     '"12182",42.8,-73.6,"Troy","NY","Rensselaer"\\n'
+     ...                     '"1218",42.8,-73.6,"Troy","NY","Rensselaer"\\n'
+     ...                     '"12183",,-73.6,"Troy","NY","Rensselaer"\\n'
+     ...                     '"12180",42.75,-73.65,"Troy","NY","Rensselaer"\\n')
+     ...     store, by_city_state = read_csv_zipcodes(csv_file)
+     >>> list(store), store['12180'].latitude, by_city_state
+     (['12180', '12182'], 42.75, {('Troy', 'NY'): ['12180', '12182']})
+     >>> store.strings['city'], list(store.codes['city'])
+     (['Troy'], [0, 0])
     '''
-    by_zipcode_dict = {}
+    zips, row_of = [], {}
+    latitudes, longitudes = array('d'), array('d')
+    strings = {field: [] for field in ZipStore.STRING_FIELDS}
+    codes = {field: array('I') for field in ZipStore.STRING_FIELDS}
+    code_of = {field: {} for field in ZipStore.STRING_FIELDS} #value -> position in strings[field]
     by_city_state_dict = {}
     
     try:
@@ -59,14 +210,28 @@ def read_csv_zipcodes(filename='zip_codes_states.csv'):
                     longitude = float(row[2].strip().replace('"', ''))
                 except (ValueError, TypeError):
                     continue #skip row if coordinates cannot be converted into floats
-                city, state, county = tuple(elem.strip().replace('"', '') for elem in row[3:])
-                
-                by_zipcode_dict[zipcode] = {'latitude': latitude,
-                                            'longitude': longitude,
-                                            'city': city,
-                                            'state': state,
-                                            'county': county
-                                            }
+                values = {}
+                for field, elem in zip(ZipStore.STRING_FIELDS, row[3:]):
+                    value = elem.strip().replace('"', '')
+                    code = code_of[field].get(value)
+                    if code is None:
+                        code = code_of[field][value] = len(strings[field])
+                        strings[field].append(value)
+                    values[field] = code
+                city, state = strings['city'][values['city']], strings['state'][values['state']]
+
+                row_num = row_of.get(zipcode)
+                if row_num is None: #new zipcode
+                    row_of[zipcode] = len(zips)
+                    zips.append(zipcode)
+                    latitudes.append(latitude)
+                    longitudes.append(longitude)
+                    for field in ZipStore.STRING_FIELDS:
+                        codes[field].append(values[field])
+                else: #repeated zipcode, the last line wins
+                    latitudes[row_num], longitudes[row_num] = latitude, longitude
+                    for field in ZipStore.STRING_FIELDS:
+                        codes[field][row_num] = values[field]
                 key = (city, state)
                 if key not in by_city_state_dict:
                     by_city_state_dict[key] = set() #to remove duplicates
@@ -75,10 +240,10 @@ def read_csv_zipcodes(filename='zip_codes_states.csv'):
             for key in by_city_state_dict:
                 by_city_state_dict[key] = sorted(by_city_state_dict[key])
             
-            if not by_zipcode_dict or not by_city_state_dict: 
+            if not zips or not by_city_state_dict: 
                 raise ValueError('No valid lines found. Please, check the format of data supplied')
                 
-            return  by_zipcode_dict, by_city_state_dict
+            return  ZipStore(zips, latitudes, longitudes, strings, codes), by_city_state_dict
         
     except FileNotFoundError:
         raise FileNotFoundError(f'The file "{filename}" is not found in the current directory')
@@ -86,9 +251,126 @@ def read_csv_zipcodes(filename='zip_codes_states.csv'):
     except csv.Error as e:
         raise ValueError(f'An error occured while processing csv-file: {e}')
             
+def _csv_signature(filename):
+    '''
+    Returns (modification time in ns, size) of the CSV-file.
+    '''
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+def _csv_hash(filename):
+    with open(filename, 'rb') as csvfile:
+        return hashlib.sha256(csvfile.read()).hexdigest()
+
+def write_index(filename, data):
+    '''
+    @requires: filename of the CSV-file, data - the tuple returned by read_csv_zipcodes
+    @modifies: writes filename + INDEX_SUFFIX next to the CSV-file
+    @effects: the index is written under a temporary name and renamed, so a broken index is never left;
+      an index that cannot be written (e.g. read-only folder) is silently skipped
+    @raises: None
+    @returns: None
+    '''
+    index_file = filename + INDEX_SUFFIX
+    tmp_file = index_file + '.tmp'
+    try:
+        mtime_ns, size = _csv_signature(filename)
+        by_zipcode, by_city_state_dict = data
+        with open(tmp_file, 'wb') as f:
+            marshal.dump((INDEX_VERSION, mtime_ns, size, _csv_hash(filename),
+                          (by_zipcode.to_parts(), by_city_state_dict)), f)
+        os.replace(tmp_file, index_file)
+    except OSError:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def read_index(filename):
+    '''
+    @requires: filename of the CSV-file
+    @modifies: may rewrite the index (see write_index) when only the modification time of the CSV-file changed
+    @effects: the index is valid if it was written by this version for a CSV-file of the same size
+      and modification time; if only the time differs (file copied or touched), the SHA-256 of the content decides
+    @raises: None
+    @returns: the tuple returned by read_csv_zipcodes, or None if there is no valid index
+
+    TESTS
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     csv_file = os.path.join(folder, 'zips.csv')
+    ...     with open(csv_file, 'w') as f:
+    ...         _ = f.write('zip_code,latitude,longitude,city,state,county\\n12180,42.7,-73.6,Troy,NY,Rensselaer\\n')
+    ...     write_index(csv_file, read_csv_zipcodes(csv_file))
+    ...     store, by_city_state = read_index(csv_file)
+    ...     print(store['12180'].city, store['12180'].latitude, by_city_state)
+    ...     os.utime(csv_file, ns=(0, 0)) #touched, the same content
+    ...     read_index(csv_file) is not None, read_index(csv_file) is not None
+    ...     with open(csv_file, 'a') as f:
+    ...         _ = f.write('12181,42.7,-73.6,Troy,NY,Rensselaer\\n')
+    ...     read_index(csv_file) is None #the CSV-file changed
+    ...     write_index(csv_file, read_csv_zipcodes(csv_file))
+    ...     with open(csv_file + INDEX_SUFFIX, 'r+b') as f:
+    ...         _ = f.truncate(os.path.getsize(csv_file + INDEX_SUFFIX) // 2)
+    ...     read_index(csv_file) is None #truncated index
+    ...     with open(csv_file + INDEX_SUFFIX, 'wb') as f:
+    ...         _ = f.write(marshal.dumps((INDEX_VERSION, 0, 0, '', ())))
+    ...     read_index(csv_file) is None #malformed index
+    Troy 42.7 {('Troy', 'NY'): ['12180']}
+    (True, True)
+    True
+    True
+    True
+    '''
+    try:
+        with open(filename + INDEX_SUFFIX, 'rb') as f:
+            raw = f.read() #marshal.loads on bytes is much faster than marshal.load on a file
+        gc.disable() #no garbage in the index, skip the collections triggered by the many new objects
+        try:
+            version, mtime_ns, size, content_hash, data = marshal.loads(raw)
+            if version != INDEX_VERSION:
+                return None
+            data = (ZipStore.from_parts(data[0]), data[1])
+        finally:
+            gc.enable()
+        current_mtime_ns, current_size = _csv_signature(filename)
+    except Exception: #whatever a truncated or malformed payload raises, the CSV-file is parsed instead
+        return None #no index, damaged index or no CSV-file
+    if current_size != size:
+        return None
+    if current_mtime_ns != mtime_ns:
+        if _csv_hash(filename) != content_hash:
+            return None
+        write_index(filename, data) #same content, remember the new time
+    return data
+
+def load_zipcodes(filename='zip_codes_states.csv'):
+    '''
+    @requires: the same as read_csv_zipcodes
+    @modifies: writes the precompiled index filename + INDEX_SUFFIX after parsing the CSV-file
+    @effects: loads the data from the index if it is valid (see read_index),
+      otherwise parses the CSV-file with read_csv_zipcodes and saves the index for the next start
+    @raises: the same as read_csv_zipcodes
+    @returns: the same as read_csv_zipcodes
+
+    TESTS
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     csv_file = os.path.join(folder, 'zips.csv')
+    ...     with open(csv_file, 'w') as f:
+    ...         _ = f.write('zip_code,latitude,longitude,city,state,county\\n12180,42.7,-73.6,Troy,NY,Rensselaer\\n')
+    ...     with open(csv_file + INDEX_SUFFIX, 'wb') as f:
+    ...         _ = f.write(b'garbage')
+    ...     list(load_zipcodes(csv_file)[0]), read_index(csv_file)[1] #parsed again, the index is rewritten
+    (['12180'], {('Troy', 'NY'): ['12180']})
+    '''
+    data = read_index(filename)
+    if data is None:
+        data = read_csv_zipcodes(filename)
+        write_index(filename, data)
+    return data
+            
 def lookup_by_zipcode(by_zipcode_dict, zip_code):
     '''
-     @requires: 1. a dictionary to search data by zipcode:
+     @requires: 1. a ZipStore (see read_csv_zipcodes) or a dictionary to search data by zipcode:
          { 5-digit zipcode : { 'latitude' : float,
                                'longitude': float, 
                                'city' : str,
@@ -100,7 +382,7 @@ def lookup_by_zipcode(by_zipcode_dict, zip_code):
      @modifies: None
      @effects: None     
      @raises: None
-     @returns: returns a dictionary of parameters 'latitude', 'longitude', 'city', 'state', 'county',
+     @returns: returns a record (ZipRecord view or dictionary) of parameters 'latitude', 'longitude', 'city', 'state', 'county',
                corresponding to the zipcode or None if no matches found.
     '''
     zip_code = zip_code.strip()
@@ -162,7 +444,7 @@ def decimal_to_dms(decimal_degrees, is_latitude):
 
 def handle_loc(by_zipcode_dict, zip_code):
     '''
-    @requires: 1. a dictionary to search data by zipcode:
+    @requires: 1. a ZipStore (see read_csv_zipcodes) or a dictionary to search data by zipcode:
         { 5-digit zipcode : { 'latitude' : float,
                               'longitude': float, 
                               'city' : str,
@@ -239,9 +521,33 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     
     return AVG_EARTH_RADIUS_MILES * c
 
+def _haversine_arrays(lat1, lon1, cos1, lat2, lon2, cos2):
+    '''
+    The steps of haversine_distance on numpy arrays (broadcast against each other);
+    cos1, cos2 are the cosines of the latitudes. Returns the distances in miles,
+    they agree with haversine_distance to about 1e-12 miles.
+    '''
+    a = np.radians(lat2 - lat1)
+    a /= 2
+    np.sin(a, out=a)
+    a **= 2
+    b = np.radians(lon2 - lon1)
+    b /= 2
+    np.sin(b, out=b)
+    b **= 2
+    b *= cos1 * cos2
+    a += b
+    np.minimum(a, 1.0, out=a) #rounding must not push 1 - a below zero
+    np.subtract(1.0, a, out=b)
+    np.sqrt(a, out=a)
+    np.sqrt(b, out=b)
+    np.arctan2(a, b, out=a)
+    a *= 2 * AVG_EARTH_RADIUS_MILES
+    return a
+
 def handle_dist(by_zipcode_dict, zip1, zip2):
     '''
-    @requires: 1. a dictionary to search data by zipcode:
+    @requires: 1. a ZipStore (see read_csv_zipcodes) or a dictionary to search data by zipcode:
         { 5-digit zipcode : { 'latitude' : float,
                               'longitude': float, 
                               'city' : str,
@@ -279,22 +585,458 @@ def handle_dist(by_zipcode_dict, zip1, zip2):
     
     print(f"The distance between {zip1} and {zip2} is {distance:.2f} miles")
                     
+class ZipDistances:
+    '''
+    Batch haversine distances over the whole ZipStore (requires numpy).
+    The latitude/longitude columns are shared with the store and the cosines of the latitudes
+    are computed once; the coordinate differences are converted to radians block by block.
+    Sources/targets are sequences of zipcodes (None means all ZIP codes);
+    the results agree with haversine_distance to about 1e-12 miles.
+
+    TESTS
+    >>> import random, tempfile
+    >>> rng = random.Random(25)
+    >>> points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(200)] + [(0.0, 180.0), (0.0, 0.0)]
+    >>> store = ZipStore([f'{idx:05d}' for idx in range(len(points))], array('d', [lat for lat, _ in points]),
+    ...                  array('d', [lon for _, lon in points]), {field: [''] for field in ZipStore.STRING_FIELDS},
+    ...                  {field: array('I', [0] * len(points)) for field in ZipStore.STRING_FIELDS})
+    >>> distances = ZipDistances(store)
+    >>> matrix = distances.matrix(chunk_elements=1000)
+    >>> matrix.shape
+    (202, 202)
+    >>> max(abs(float(matrix[i, j]) - haversine_distance(*points[i], *points[j]))
+    ...     for i in range(len(points)) for j in range(len(points))) < 1e-9
+    True
+    >>> sources, targets = ['00201', '00007', '00200'], ['00200', '00201']
+    >>> distances.matrix(sources, targets).round(6).tolist()
+    [[12437.565316, 0.0], [8298.407507, 4139.157809], [0.0, 12437.565316]]
+    >>> bool((distances.from_zipcode('00007', targets) == distances.matrix(['00007'], targets)[0]).all())
+    True
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     distances.export(os.path.join(folder, 'distances.npy'), chunk_elements=1000)
+    ...     bool((np.load(os.path.join(folder, 'distances.npy')) == matrix).all())
+    ...     distances.export(os.path.join(folder, 'distances.csv'), sources, targets, chunk_elements=1)
+    ...     with open(os.path.join(folder, 'distances.csv'), newline='') as f:
+    ...         rows = list(csv.reader(f))
+    True
+    >>> rows[0], [row[0] for row in rows[1:]]
+    (['zipcode', '00200', '00201'], ['00201', '00007', '00200'])
+    >>> bool((np.array([[float(value) for value in row[1:]] for row in rows[1:]]) == distances.matrix(sources, targets)).all())
+    True
+    >>> distances.matrix(['00000', '99999'])
+    Traceback (most recent call last):
+    ...
+    KeyError: '99999'
+    '''
+    def __init__(self, store):
+        if np is None:
+            raise ImportError("numpy is required for the batch distances")
+        self.store = store
+        self.latitudes = np.frombuffer(store.latitudes, dtype=np.float64)
+        self.longitudes = np.frombuffer(store.longitudes, dtype=np.float64)
+        self.cos_phi = np.cos(np.radians(self.latitudes))
+
+    def rows(self, zipcodes=None):
+        '''
+        @requires: a sequence of zipcodes or None
+        @modifies: None
+        @effects: None
+        @raises: KeyError if a zipcode is unknown
+        @returns: an integer array with the rows of the zipcodes (all rows for None)
+        '''
+        if zipcodes is None:
+            return np.arange(len(self.store))
+        row_of = self.store.row_of
+        return np.fromiter((row_of[zipcode] for zipcode in zipcodes), dtype=np.intp, count=len(zipcodes))
+
+    def _block(self, lat1, lon1, cos1, target_rows):
+        #(sources x targets) distances, the sources are columns
+        return _haversine_arrays(lat1, lon1, cos1, self.latitudes[target_rows], self.longitudes[target_rows],
+                                 self.cos_phi[target_rows])
+
+    def from_point(self, lat, lon, targets=None):
+        '''
+        @requires: coordinates of the origin in decimal degrees, a sequence of target zipcodes or None (all)
+        @modifies: None
+        @effects: None
+        @raises: KeyError if a target zipcode is unknown
+        @returns: a 1-D array with the distances in miles from the origin to the targets
+        '''
+        cos1 = np.cos(np.radians(np.float64(lat)))
+        return self._block(np.float64(lat), np.float64(lon), cos1, self.rows(targets))
+
+    def from_zipcode(self, zipcode, targets=None):
+        '''
+        @requires: a zipcode of the store, a sequence of target zipcodes or None (all)
+        @modifies: None
+        @effects: None
+        @raises: KeyError if a zipcode is unknown
+        @returns: a 1-D array with the distances in miles from zipcode to the targets
+        '''
+        row = self.store.row_of[zipcode]
+        return self._block(self.latitudes[row], self.longitudes[row], self.cos_phi[row], self.rows(targets))
+
+    def blocks(self, sources=None, targets=None, chunk_elements=DISTANCE_CHUNK_ELEMENTS):
+        '''
+        @requires: sequences of source/target zipcodes or None (all), chunk_elements is a positive integer
+        @modifies: None
+        @effects: computes the sources x targets distances a few source rows at a time,
+          a block holds at most chunk_elements distances (at least one source row)
+        @raises: KeyError if a zipcode is unknown
+        @returns: a generator of (index of the first source row, 2-D array of the distances in miles)
+        '''
+        return self._row_blocks(self.rows(sources), self.rows(targets), chunk_elements)
+
+    def _row_blocks(self, source_rows, target_rows, chunk_elements):
+        #blocks() on rows of the store that are already resolved
+        step = max(1, chunk_elements // max(1, len(target_rows)))
+        for start in range(0, len(source_rows), step):
+            rows = source_rows[start:start + step]
+            yield start, self._block(self.latitudes[rows, None], self.longitudes[rows, None],
+                                     self.cos_phi[rows, None], target_rows)
+
+    def matrix(self, sources=None, targets=None, chunk_elements=DISTANCE_CHUNK_ELEMENTS):
+        '''
+        @requires: sequences of source/target zipcodes or None (all)
+        @modifies: None
+        @effects: None
+        @raises: KeyError if a zipcode is unknown
+        @returns: a 2-D array (sources x targets) with the distances in miles
+        '''
+        source_rows = self.rows(sources)
+        target_rows = self.rows(targets)
+        result = np.empty((len(source_rows), len(target_rows)))
+        for start, block in self._row_blocks(source_rows, target_rows, chunk_elements):
+            result[start:start + len(block)] = block
+        return result
+
+    def export(self, filename, sources=None, targets=None, chunk_elements=DISTANCE_CHUNK_ELEMENTS):
+        '''
+        @requires: filename ending with '.npy' (NumPy array) or anything else (CSV-file),
+          sequences of source/target zipcodes or None (all)
+        @modifies: writes filename to file system
+        @effects: writes the sources x targets distance matrix block by block, so the whole matrix
+          is never held in memory. The CSV-file has a header 'zipcode' + target zipcodes
+          and a row per source zipcode.
+        @raises: KeyError if a zipcode is unknown, IOError if cannot write the file
+        @returns: None
+        '''
+        zips = self.store.zips
+        source_rows = self.rows(sources)
+        target_rows = self.rows(targets)
+        if filename.endswith('.npy'):
+            result = np.lib.format.open_memmap(filename, mode='w+', shape=(len(source_rows), len(target_rows)))
+            for start, block in self._row_blocks(source_rows, target_rows, chunk_elements):
+                result[start:start + len(block)] = block
+            result.flush()
+            del result
+            return
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['zipcode'] + [zips[row] for row in target_rows])
+            for start, block in self._row_blocks(source_rows, target_rows, chunk_elements):
+                for row, distances in zip(source_rows[start:start + len(block)], block.tolist()):
+                    writer.writerow([zips[row]] + distances)
+
+class SpatialIndex:
+    '''
+    Grid index over the ZIP codes of a ZipStore. The rows are sorted by latitude/longitude cells
+    of GRID_CELL_DEGREES, so the cells of one latitude band are contiguous and the cells a query
+    can reach (the longitude span of the spherical cap, wrapping around the 180th meridian)
+    are a few slices found by bisection. With numpy (vectorized), all the candidates of the slices
+    are measured at once; otherwise they are filtered one by one with the haversine term
+    on precomputed radians and cosines. The reported distances are those of haversine_distance,
+    so the results are exactly those of a brute-force scan.
+    Measured on the 42049 ZIP codes of zip_codes_states.csv (numpy, one core): within 25 miles takes
+    about 1.1 ms around 10001 (724 hits) and 0.8 ms around 90001 (528 hits), most of it in
+    haversine_distance of the hits; nearest 5 takes about 0.1 ms from a ZIP code, and 1.6 ms on average
+    (7.5 ms at most) from random points of the globe, where oceans need radii of thousands of miles.
+    Without numpy, within is about 1.5 ms, but nearest from remote points averages about 30 ms.
+
+    TESTS
+    >>> import random
+    >>> rng = random.Random(5)
+    >>> points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(3000)]
+    >>> points += [(40.7 + rng.gauss(0, 0.3), -74.0 + rng.gauss(0, 0.3)) for _ in range(1000)] #a city
+    >>> points += [(89.99, 0.0), (-89.99, 45.0), (10.0, 179.999), (10.0, -179.999), (10.0, 180.0)]
+    >>> store = ZipStore([f'{idx:05d}' for idx in range(len(points))], array('d', [lat for lat, _ in points]),
+    ...                  array('d', [lon for _, lon in points]), {field: [''] for field in ZipStore.STRING_FIELDS},
+    ...                  {field: array('I', [0] * len(points)) for field in ZipStore.STRING_FIELDS})
+    >>> def brute_force(lat, lon):
+    ...     return sorted((haversine_distance(lat, lon, store.latitudes[row], store.longitudes[row]), store.zips[row])
+    ...                   for row in range(len(store)))
+    >>> queries = [(40.7, -74.0, 5), (40.7, -74.0, 30), (10.0, 180.0, 50), (10.0, -179.99, 700), (89.9, 100.0, 300),
+    ...            (-89.0, 0.0, 150), (0.0, 0.0, 0), (-33.0, 151.0, 12450), (40.72, -73.98, float('inf'))]
+    >>> for vectorized in ([False, True] if np is not None else [False]):
+    ...     index = SpatialIndex(store, vectorized=vectorized)
+    ...     for lat, lon, radius in queries:
+    ...         expected = brute_force(lat, lon)
+    ...         assert index.within(lat, lon, radius) == [item for item in expected if item[0] <= radius]
+    ...         for k in (1, 7, 50):
+    ...             assert index.nearest(lat, lon, k) == expected[:k]
+    ...         assert index.nearest(lat, lon, 3, exclude=[expected[0][1]]) == expected[1:4]
+    >>> [zipcode for _, zipcode in SpatialIndex(store).within(10.0, 180.0, 1)]
+    ['04004', '04003', '04002']
+    >>> len(SpatialIndex(store).nearest(0.0, 0.0, 10 ** 6))
+    4005
+    '''
+    def __init__(self, store, cell_degrees=GRID_CELL_DEGREES, vectorized=None):
+        self.store = store
+        self.lat_cells = math.ceil(180 / cell_degrees)
+        self.lon_cells = math.ceil(360 / cell_degrees)
+        self.lat_step = 180 / self.lat_cells #the cells divide the sphere exactly
+        self.lon_step = 360 / self.lon_cells
+        self.vectorized = np is not None if vectorized is None else vectorized
+        cells = [self._cell_of(lat, lon) for lat, lon in zip(store.latitudes, store.longitudes)]
+        order = sorted(range(len(cells)), key=cells.__getitem__)
+        self.rows = array('l', order) #row of the store at every position of the index
+        self.lon_keys = array('l', (cells[row][1] for row in order))
+        #positions band_start[i]..band_start[i + 1] hold latitude band i
+        self.band_start = array('l', [0]) * (self.lat_cells + 1)
+        for lat_cell, _ in cells:
+            self.band_start[lat_cell + 1] += 1
+        for lat_cell in range(self.lat_cells):
+            self.band_start[lat_cell + 1] += self.band_start[lat_cell]
+        self.latitudes = array('d', (store.latitudes[row] for row in order))
+        self.longitudes = array('d', (store.longitudes[row] for row in order))
+        self.phi = array('d', map(math.radians, self.latitudes))
+        self.lam = array('d', map(math.radians, self.longitudes))
+        self.cos_phi = array('d', map(math.cos, self.phi))
+        if self.vectorized:
+            self.columns = tuple(np.frombuffer(column, dtype=np.float64)
+                                 for column in (self.latitudes, self.longitudes, self.cos_phi))
+
+    def _cell_of(self, lat, lon):
+        return (min(int((lat + 90) // self.lat_step), self.lat_cells - 1),
+                int((lon + 180) // self.lon_step) % self.lon_cells)
+
+    def _slices(self, lat, lon, radius):
+        '''
+        Returns (start, stop) position ranges covering every cell that can hold a point within radius.
+        '''
+        angle = min(radius / AVG_EARTH_RADIUS_MILES, math.pi) #angular radius
+        delta_lat = math.degrees(angle) + 1e-9 #the margin covers the rounding of the cell bounds
+        first_lat = max(int((lat - delta_lat + 90) // self.lat_step), 0)
+        last_lat = min(int((lat + delta_lat + 90) // self.lat_step), self.lat_cells - 1)
+        band_start = self.band_start
+        cos_lat = math.cos(math.radians(lat))
+        if angle >= math.pi / 2 or math.sin(angle) >= cos_lat: #the cap contains a pole
+            return [(band_start[first_lat], band_start[last_lat + 1])]
+        delta_lon = math.degrees(math.asin(math.sin(angle) / cos_lat)) + 1e-9
+        first_lon = int((lon - delta_lon + 180) // self.lon_step)
+        last_lon = int((lon + delta_lon + 180) // self.lon_step)
+        if last_lon - first_lon + 1 >= self.lon_cells:
+            return [(band_start[first_lat], band_start[last_lat + 1])]
+        first_lon %= self.lon_cells
+        last_lon %= self.lon_cells
+        if first_lon <= last_lon:
+            lon_ranges = ((first_lon, last_lon + 1),)
+        else: #across the 180th meridian
+            lon_ranges = ((first_lon, self.lon_cells), (0, last_lon + 1))
+        lon_keys = self.lon_keys
+        slices = []
+        for lat_cell in range(first_lat, last_lat + 1):
+            low, high = band_start[lat_cell], band_start[lat_cell + 1]
+            if low == high:
+                continue
+            for first, stop in lon_ranges:
+                start = bisect.bisect_left(lon_keys, first, low, high)
+                end = bisect.bisect_left(lon_keys, stop, start, high)
+                if start < end:
+                    slices.append((start, end))
+        return slices
+
+    def _measure(self, lat, lon, slices):
+        #positions and approximate (vectorized) distances of all the candidates in slices
+        if not slices:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        positions = np.concatenate([np.arange(start, stop) for start, stop in slices])
+        latitudes, longitudes, cos_phi = self.columns
+        return positions, _haversine_arrays(lat, lon, math.cos(math.radians(lat)), latitudes[positions],
+                                            longitudes[positions], cos_phi[positions])
+
+    def _exact(self, lat, lon, positions):
+        latitudes, longitudes, rows, zips = self.latitudes, self.longitudes, self.rows, self.store.zips
+        return [(haversine_distance(lat, lon, latitudes[position], longitudes[position]), zips[rows[position]])
+                for position in positions]
+
+    def within(self, lat, lon, radius):
+        '''
+        @requires: coordinates of the origin in decimal degrees, radius in miles (non-negative, may be inf)
+        @modifies: None
+        @effects: None
+        @raises: None
+        @returns: a list of (distance in miles, zipcode) of all ZIP codes within radius, nearest first
+        '''
+        slices = self._slices(lat, lon, radius)
+        if self.vectorized:
+            positions, distances = self._measure(lat, lon, slices)
+            found = self._exact(lat, lon, positions[distances <= radius + BORDER_MILES].tolist())
+            found = [item for item in found if item[0] <= radius]
+        else:
+            phi1, lam1 = math.radians(lat), math.radians(lon)
+            cos1 = math.cos(phi1)
+            #haversine term a of the radius, a little larger so that rounding never drops a point on the border
+            limit = math.sin(min(radius / AVG_EARTH_RADIUS_MILES, math.pi) / 2) ** 2 + 1e-12
+            phi, lam, cos_phi = self.phi, self.lam, self.cos_phi
+            sin = math.sin
+            near = [position for start, stop in slices for position in range(start, stop)
+                    if sin((phi[position] - phi1) / 2) ** 2
+                    + cos1 * cos_phi[position] * sin((lam[position] - lam1) / 2) ** 2 <= limit]
+            found = [item for item in self._exact(lat, lon, near) if item[0] <= radius]
+        found.sort()
+        return found
+
+    def nearest(self, lat, lon, k, exclude=()):
+        '''
+        @requires: coordinates of the origin in decimal degrees, k is a positive integer,
+          exclude is a collection of zipcodes to skip (e.g. the origin itself)
+        @modifies: None
+        @effects: doubles the radius from NEAREST_START_MILES until its cells hold enough ZIP codes
+          (only counted, no distances); vectorized, keeps doubling until enough of them are within
+          the radius, then measures exactly only those up to the k-th distance
+        @raises: None
+        @returns: a list of (distance in miles, zipcode) of the k nearest ZIP codes, nearest first
+          (fewer if the store is smaller)
+        '''
+        exclude = set(exclude)
+        need = k + len(exclude)
+        max_radius = math.pi * AVG_EARTH_RADIUS_MILES #half of the circumference covers the whole sphere
+        radius = NEAREST_START_MILES
+        slices = self._slices(lat, lon, radius)
+        while radius < max_radius and sum(stop - start for start, stop in slices) < need:
+            radius *= 2
+            slices = self._slices(lat, lon, radius)
+        if self.vectorized:
+            positions, distances = self._measure(lat, lon, slices)
+            #the cells also hold points beyond radius (whole bands around the poles): keep doubling
+            #until the cap itself holds enough of them, so that no cell outside it can be nearer
+            while radius < max_radius and np.count_nonzero(distances <= radius) < need:
+                radius *= 2
+                positions, distances = self._measure(lat, lon, self._slices(lat, lon, radius))
+            if len(positions) > need:
+                #the need-th smallest distance bounds the k nearest that are not excluded
+                bound = np.partition(distances, need - 1)[need - 1] + BORDER_MILES
+                positions = positions[distances <= bound]
+            candidates = heapq.nsmallest(need, (item for item in self._exact(lat, lon, positions.tolist())
+                                                if item[1] not in exclude))
+            return candidates[:k]
+        candidates = self._exact(lat, lon, [position for start, stop in slices for position in range(start, stop)])
+        candidates = heapq.nsmallest(need, (item for item in candidates if item[1] not in exclude))
+        if len(candidates) >= k and candidates[k - 1][0] > radius:
+            #the cells of radius may miss points nearer than the k-th candidate, all of them are within its distance
+            candidates = [item for item in self.within(lat, lon, candidates[k - 1][0]) if item[1] not in exclude]
+        return candidates[:k]
+
+def parse_location(by_zipcode_dict, text):
+    '''
+    @requires: a ZipStore (or dictionary) to search data by zipcode, text - a zipcode or 'latitude, longitude'
+    @modifies: None
+    @effects: None
+    @raises: None
+    @returns: a tuple (latitude, longitude, zipcode or None) or None if text is neither a known zipcode
+      nor valid coordinates
+
+    TESTS
+    >>> zipcodes = {'10001': {'latitude': 40.75, 'longitude': -73.99}}
+    >>> parse_location(zipcodes, ' 10001 ')
+    (40.75, -73.99, '10001')
+    >>> parse_location(zipcodes, '34.05, -118.25')
+    (34.05, -118.25, None)
+    >>> parse_location(zipcodes, '-90,180')
+    (-90.0, 180.0, None)
+    >>> [parse_location(zipcodes, text) for text in ('99999', '91, 0', '0, -180.5', 'nan, 0', 'inf, 0', '1, 2, 3', '')]
+    [None, None, None, None, None, None, None]
+    '''
+    text = text.strip()
+    record = lookup_by_zipcode(by_zipcode_dict, text)
+    if record is not None:
+        return record['latitude'], record['longitude'], text
+    try:
+        lat, lon = (float(part) for part in text.split(','))
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon, None
+
+def _format_found(found):
+    return ", ".join(f"{zipcode} ({distance:.2f} mi)" for distance, zipcode in found)
+
+def handle_near(spatial_index, by_zipcode_dict, origin, radius):
+    '''
+    @requires: 1. a SpatialIndex of the ZIP codes
+               2. a ZipStore to search data by zipcode
+               3. origin - a zipcode or 'latitude, longitude'
+               4. radius in miles (string)
+    @modifies: processes 'near' command
+    @effects: prints out the ZIP codes within the radius of the origin with their distances, nearest first
+      (the origin zipcode itself is not listed), or a notification of error
+    @raises: None
+    @returns: None
+    '''
+    location = parse_location(by_zipcode_dict, origin)
+    if location is None:
+        print("Invalid ZIP Code or coordinates: " + origin.strip())
+        return
+    try:
+        radius_miles = float(radius)
+    except ValueError:
+        radius_miles = -1.0
+    if not (math.isfinite(radius_miles) and radius_miles >= 0):
+        print("Invalid radius: " + radius.strip())
+        return
+    lat, lon, zip_code = location
+    found = [item for item in spatial_index.within(lat, lon, radius_miles) if item[1] != zip_code]
+    if not found:
+        print(f"No ZIP Codes found within {radius_miles:.2f} miles of {origin.strip()}")
+    else:
+        print(f"The following ZIP Code(s) found within {radius_miles:.2f} miles of {origin.strip()}: "
+              + _format_found(found))
+
+def handle_nearest(spatial_index, by_zipcode_dict, origin, count):
+    '''
+    @requires: 1. a SpatialIndex of the ZIP codes
+               2. a ZipStore to search data by zipcode
+               3. origin - a zipcode or 'latitude, longitude'
+               4. count - number of ZIP codes to find (string)
+    @modifies: processes 'nearest' command
+    @effects: prints out the count nearest ZIP codes to the origin with their distances
+      (the origin zipcode itself is not listed), or a notification of error
+    @raises: None
+    @returns: None
+    '''
+    location = parse_location(by_zipcode_dict, origin)
+    if location is None:
+        print("Invalid ZIP Code or coordinates: " + origin.strip())
+        return
+    if not count.strip().isdigit() or int(count) < 1:
+        print("Invalid number of ZIP Codes: " + count.strip())
+        return
+    lat, lon, zip_code = location
+    found = spatial_index.nearest(lat, lon, int(count), exclude=(zip_code,))
+    print(f"The {len(found)} nearest ZIP Code(s) to {origin.strip()}: " + _format_found(found))
+                    
 def main():
     '''
     @requires: None
     @modifies: launches a REPL-interface of the program
-    @effects: 1. loads data from 'zip_codes.csv'
+    @effects: 1. loads data from 'zip_codes_states.csv' (or its precompiled index, see load_zipcodes);
+                 the SpatialIndex is built on the first 'near' or 'nearest' command
               2. enters a loop of command processing:
                   -'loc': location by a zipcode
                   -'zip': zipcodes by a 'city-state' combination
                   -'dist': calculation of distance between 2 zipcodes
+                  -'near': zipcodes within a radius of a zipcode or coordinates
+                  -'nearest': the k nearest zipcodes to a zipcode or coordinates
                   -'end': program exit
     @raises: None 
     @returns: None
     '''
     #data upload
     try:
-        by_zipcode_dict, by_city_state_dict = read_csv_zipcodes()
+        by_zipcode_dict, by_city_state_dict = load_zipcodes()
+        spatial_index = None #built by the first 'near'/'nearest', the other commands do not need it
         print("Loaded " + str(len(by_zipcode_dict)) + " ZIP codes")
         print()
     except Exception as e:
@@ -304,7 +1046,7 @@ def main():
     #REPL
     while True:
         try:
-            command = input("Command ('loc', 'zip', 'dist', 'end') => ").strip().lower()
+            command = input("Command ('loc', 'zip', 'dist', 'near', 'nearest', 'end') => ").strip().lower()
             print(command)
             
             if command == 'end':
@@ -326,6 +1068,22 @@ def main():
                 zip2 = input("Enter the second ZIP Code => ").strip()
                 print(zip2)
                 handle_dist(by_zipcode_dict, zip1, zip2)
+            elif command == 'near':
+                origin = input("Enter a ZIP Code or coordinates 'latitude, longitude' => ").strip()
+                print(origin)
+                radius = input("Enter the radius in miles => ").strip()
+                print(radius)
+                if spatial_index is None:
+                    spatial_index = SpatialIndex(by_zipcode_dict)
+                handle_near(spatial_index, by_zipcode_dict, origin, radius)
+            elif command == 'nearest':
+                origin = input("Enter a ZIP Code or coordinates 'latitude, longitude' => ").strip()
+                print(origin)
+                count = input("Enter the number of ZIP Codes to find => ").strip()
+                print(count)
+                if spatial_index is None:
+                    spatial_index = SpatialIndex(by_zipcode_dict)
+                handle_nearest(spatial_index, by_zipcode_dict, origin, count)
             else:
                 print("Invalid command, ignoring")
         except (KeyboardInterrupt, EOFError):